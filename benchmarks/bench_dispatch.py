@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""Micro-benchmark of guild message dispatch.
+
+Compares the old fan-out (one task per plugin, every command regex tried on
+every message) with the indexed Dispatcher. Runs offline:
+
+    python -m benchmarks.bench_dispatch [messages] [command_ratio]
+"""
+import asyncio
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from qbot.const import PREFIX
+from qbot.decorators import command
+from qbot.dispatcher import Dispatcher
+from qbot.plugin import Plugin
+
+PLUGIN_COUNT = 6
+COMMANDS_PER_PLUGIN = 4
+
+async def _noop(self, message, args):  # pylint: disable=W0613
+    pass
+
+def make_plugin_class(index):
+    attrs = {}
+    for j in range(COMMANDS_PER_PLUGIN):
+        name = f"cmd{index}_{j}"
+        # a distinct function per command so wraps() keeps each name
+        func = type(_noop)(_noop.__code__, _noop.__globals__, name)
+        attrs[name] = command(pattern="^" + PREFIX + name + " (.*)")(func)
+    return type(f"BenchPlugin{index}", (Plugin,), attrs)
+
+def make_client(loop):
+    client = SimpleNamespace(loop=loop, db=None, plugins=[],
+                             send_message=None)
+    client.dispatcher = Dispatcher(client)
+    for i in range(PLUGIN_COUNT):
+        client.plugins.append(make_plugin_class(i)(client))
+    client.dispatcher.build(client.plugins)
+    return client
+
+def make_messages(count, command_ratio):
+    owner = SimpleNamespace(id=1)
+    guild = SimpleNamespace(owner=owner, name="bench")
+    perms = SimpleNamespace(manage_guild=True, administrator=False)
+    author = SimpleNamespace(id=2, name="user", discriminator="0001",
+                             guild=guild, guild_permissions=perms)
+    names = [f"cmd{i}_{j}" for i in range(PLUGIN_COUNT)
+             for j in range(COMMANDS_PER_PLUGIN)]
+    messages = []
+    for __ in range(count):
+        if random.random() < command_ratio:
+            content = PREFIX + random.choice(names) + " some arguments"
+        else:
+            content = "just chatting about nothing in particular"
+        messages.append(SimpleNamespace(content=content, clean_content=content,
+                                        author=author, guild=guild))
+    return messages
+
+async def legacy_dispatch(client, message):
+    # pylint: disable=W0212
+    for plugin in client.plugins:
+        client.loop.create_task(plugin._on_message(message))
+
+async def run(label, dispatch, client, messages):
+    start = time.perf_counter()
+    for message in messages:
+        await dispatch(client, message)
+    # let the tasks scheduled by the legacy path drain
+    pending = [task for task in asyncio.all_tasks()
+               if task is not asyncio.current_task()]
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(messages) / elapsed:>12,.0f} messages/sec")
+
+async def main(count, command_ratio):
+    loop = asyncio.get_event_loop()
+    client = make_client(loop)
+    messages = make_messages(count, command_ratio)
+    print(f"{count} messages, {command_ratio:.0%} commands, "
+          f"{PLUGIN_COUNT} plugins x {COMMANDS_PER_PLUGIN} commands")
+    await run("before", legacy_dispatch, client, messages)
+    await run("after", lambda c, m: c.dispatcher.dispatch(m), client,
+              messages)
+
+if __name__ == "__main__":
+    random.seed(0)
+    asyncio.get_event_loop().run_until_complete(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.02))
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+"""Benchmark of the whole guild message hot path.
+
+Replays a synthetic message stream through QBot.on_message, the
+dispatcher, Plugin._on_message and the @command wrappers (regex match,
+permission check, logging) with a stub Discord connection, so it runs
+offline. Reports throughput, per-message latency and memory allocated
+per message:
+
+    python -m benchmarks.bench_message [messages] [command_ratio] [guilds]
+"""
+import asyncio
+from datetime import datetime
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import discord
+
+from qbot.bot import QBot
+from qbot.const import PREFIX
+from qbot.decorators import command
+from qbot.dispatcher import Dispatcher
+from qbot.messagecache import MessageCache
+from qbot.plugin import Plugin
+
+AUTHORS_PER_GUILD = 20
+CHANNELS_PER_GUILD = 3
+
+async def admins_only(member):  # pylint: disable=W0613
+    return False
+
+class BenchPlugin(Plugin):
+    @command(pattern="^" + PREFIX + "ping$", description="Reply")
+    async def ping(self, message, __):
+        await self.client.send_message(message.channel.id, "pong")
+
+    @command(pattern="^" + PREFIX + "echo (.*)", description="Echo back")
+    async def echo(self, message, args):
+        await self.client.send_message(message.channel.id, args[0])
+
+    @command(pattern="^" + PREFIX + "admin (.*)", description="Admin only",
+             user_check=admins_only)
+    async def admin(self, message, args):
+        await self.client.send_message(message.channel.id, args[0])
+
+COMMANDS = ("ping", "echo some text", "admin do something",
+            "unknown command")
+
+class FakeMember(discord.Member):
+    """A Member as far as isinstance is concerned, without a connection"""
+    def __init__(self, member_id, guild, admin):  # pylint: disable=W0231
+        self.guild = guild
+        self._fake_id = member_id
+        self._fake_perms = SimpleNamespace(manage_guild=admin,
+                                           administrator=False)
+
+    id = property(lambda self: self._fake_id)
+    name = property(lambda self: f"user{self._fake_id}")
+    discriminator = "0001"
+    guild_permissions = property(lambda self: self._fake_perms)
+
+class FakeHTTP:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, channel_id, content, **kwargs):
+        # pylint: disable=W0613
+        self.sent += 1
+        return {"id": "1", "channel_id": str(channel_id), "content": content}
+
+def make_client():
+    client = QBot.__new__(QBot)
+    client.loop = asyncio.get_event_loop()
+    client.http = FakeHTTP()
+    client.db = None
+    client.message_cache = MessageCache()
+    client.plugins = [BenchPlugin(client)]
+    client.dispatcher = Dispatcher(client)
+    client.dispatcher.build(client.plugins)
+    return client
+
+def make_messages(count, command_ratio, guild_count):
+    guilds = []
+    for i in range(guild_count):
+        guild = SimpleNamespace(id=1000 + i, name=f"guild{i}")
+        authors = [FakeMember(i * AUTHORS_PER_GUILD + j + 1, guild, j == 0)
+                   for j in range(AUTHORS_PER_GUILD)]
+        guild.owner = authors[0]
+        channels = [SimpleNamespace(id=(i + 1) * 100 + j)
+                    for j in range(CHANNELS_PER_GUILD)]
+        guilds.append((guild, authors, channels))
+    messages = []
+    now = datetime.utcnow()
+    for message_id in range(count):
+        guild, authors, channels = random.choice(guilds)
+        if random.random() < command_ratio:
+            content = PREFIX + random.choice(COMMANDS)
+        else:
+            content = "just chatting about nothing in particular"
+        messages.append(SimpleNamespace(
+            id=message_id, content=content, clean_content=content,
+            author=random.choice(authors), guild=guild,
+            channel=random.choice(channels), created_at=now))
+    return messages
+
+async def measure(client, messages):
+    latencies = []
+    start = time.perf_counter()
+    for message in messages:
+        before = time.perf_counter_ns()
+        await client.on_message(message)
+        latencies.append(time.perf_counter_ns() - before)
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+async def measure_memory(client, messages):
+    """Return the mean peak bytes allocated while handling a message and
+    the memory blocks still held per message afterwards
+    """
+    tracemalloc.start()
+    peaks = []
+    start_blocks = len(tracemalloc.take_snapshot().traces)
+    for message in messages:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await client.on_message(message)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    retained = len(tracemalloc.take_snapshot().traces) - start_blocks
+    tracemalloc.stop()
+    return statistics.mean(peaks), retained / len(messages)
+
+async def main(count, command_ratio, guild_count):
+    # Keep the command logging on, that's part of the hot path
+    logging.basicConfig(level=logging.INFO,
+                        stream=open(os.devnull, "w"))
+    client = make_client()
+    messages = make_messages(count, command_ratio, guild_count)
+    print(f"{count} messages, {command_ratio:.0%} commands, "
+          f"{guild_count} guilds")
+
+    await measure(client, messages[:count // 10])  # warm up
+    elapsed, latencies = await measure(client, messages)
+    latencies.sort()
+    print(f"throughput  {count / elapsed:>12,.0f} messages/sec")
+    print(f"latency p50 {latencies[len(latencies) // 2] / 1000:>12.1f}us")
+    print(f"latency p99 {latencies[len(latencies) * 99 // 100] / 1000:>12.1f}"
+          "us")
+
+    sample = messages[:min(count, 5000)]
+    if hasattr(tracemalloc, "reset_peak"):
+        peak, retained = await measure_memory(client, sample)
+        print(f"allocated   {peak:>12,.0f} bytes/message (peak)")
+        print(f"retained    {retained:>12.2f} blocks/message")
+    print(f"replies     {client.http.sent:>12,}")
+
+if __name__ == "__main__":
+    random.seed(0)
+    asyncio.get_event_loop().run_until_complete(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.05,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 100))
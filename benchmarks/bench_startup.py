@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""Cold-start benchmark, from the first import to the end of on_ready.
+
+Every round runs in a fresh interpreter so nothing is already imported.
+Uses qbot/config.py with a throwaway DB and doesn't connect to Discord.
+
+    python -m benchmarks.bench_startup [rounds] [plugin,plugin,...]
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ("selenium", "lxml", "symspellpy")
+
+def child(db_path, plugins):
+    """Start the bot once, print the duration of each phase as JSON"""
+    start = time.perf_counter()
+    from qbot import config
+    config.DB_PATH = db_path
+    if plugins:
+        config.PLUGINS = plugins.split(",")
+    from qbot.bot import QBot
+    imported = time.perf_counter()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bot = QBot(loop=loop)
+    loaded = time.perf_counter()
+
+    async def ready():
+        await bot.db.wait_until_ready()
+        await bot.add_all_guilds()
+        await bot.settings.load()
+        await asyncio.gather(*(plugin.on_ready() for plugin in bot.plugins))
+
+    loop.run_until_complete(ready())
+    done = time.perf_counter()
+    print(json.dumps({
+        "import": imported - start,
+        "load": loaded - imported,
+        "ready": done - loaded,
+        "total": done - start,
+        "heavy": [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+    # Skip the teardown, the bg tasks never got to run
+    os._exit(0)  # pylint: disable=W0212
+
+def run_round(plugins):
+    with tempfile.TemporaryDirectory() as tmp:
+        output = subprocess.check_output(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child",
+             os.path.join(tmp, "bench.db"), plugins])
+    return json.loads(output.decode().splitlines()[-1])
+
+def report(label, results):
+    print(f"{label}:")
+    for phase in ("import", "load", "ready", "total"):
+        times = [result[phase] * 1000 for result in results]
+        print(f"  {phase:<6} median {statistics.median(times):8.1f}ms  "
+              f"min {min(times):8.1f}ms")
+    print(f"  heavy modules loaded: "
+          f"{', '.join(results[-1]['heavy']) or 'none'}")
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+        return
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    subset = sys.argv[2] if len(sys.argv) > 2 else "help,moderator,streamers"
+    report("config.PLUGINS", [run_round("") for __ in range(rounds)])
+    report(subset, [run_round(subset) for __ in range(rounds)])
+
+if __name__ == "__main__":
+    main()
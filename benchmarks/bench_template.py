@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""Micro-benchmark of announcement rendering for a fan-out to many guilds.
+
+Compares the old replace_multiple (regex built and compiled on every call)
+with compiled, cached templates rendered in one batch per guild:
+
+    python -m benchmarks.bench_template [guilds] [rounds]
+"""
+import re
+import sys
+import time
+
+from qbot.template import compile_template
+
+TEXTS = ["{streamer} is now live! {link}",
+         "Hey @everyone, {streamer} started streaming: {link}",
+         "🔴 LIVE {streamer} → {link} (come say hi to {streamer}!)"]
+
+def replace_multiple(replacement, string):
+    """The implementation templates replaced, kept as the baseline"""
+    replacement = dict((re.escape(key), val)
+                       for key, val in replacement.items())
+    pattern = re.compile("|".join(replacement.keys()))
+    return pattern.sub(lambda m: replacement[re.escape(m.group(0))], string)
+
+def before(guild_texts, streamer):
+    rep = {"{streamer}": streamer, "{link}": "https://www.twitch.tv/" +
+           streamer}
+    return [replace_multiple(rep, text) for text in guild_texts]
+
+def after(guild_texts, streamer):
+    values = [{"streamer": streamer,
+               "link": "https://www.twitch.tv/" + streamer}]
+    return [compile_template(text).render_many(values)[0]
+            for text in guild_texts]
+
+def run(label, render, guild_texts, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        render(guild_texts, f"streamer{i}")
+    elapsed = time.perf_counter() - start
+    per_fanout = elapsed / rounds * 1000
+    print(f"{label:<10} {per_fanout:>8.3f} ms per fan-out "
+          f"({len(guild_texts) * rounds / elapsed:,.0f} renders/sec)")
+
+def main(guilds, rounds):
+    # every guild has its own text, a few of them shared
+    guild_texts = [TEXTS[i % len(TEXTS)] + ("" if i % 4 else f" #{i}")
+                   for i in range(guilds)]
+    assert before(guild_texts, "x") == after(guild_texts, "x")
+    print(f"fan-out to {guilds} guilds, {rounds} rounds")
+    run("before", before, guild_texts, rounds)
+    run("after", after, guild_texts, rounds)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100)
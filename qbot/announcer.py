@@ -0,0 +1,131 @@
+import asyncio
+from collections import deque
+import logging
+
+from discord.errors import HTTPException
+
+LOG = logging.getLogger("discord")
+
+ANNOUNCE_WORKERS = 8
+ANNOUNCE_RETRIES = 3
+
+class Announcement:  # pylint: disable=R0903
+    def __init__(self, channel_id, content, future):
+        self.channel_id = channel_id
+        self.content = content
+        self.future = future
+        self.attempts = 0
+
+    def settle(self, delivered):
+        if not self.future.done():
+            self.future.set_result(delivered)
+
+class Announcer:
+    """Outbound queue for bot announcements.
+
+    Messages to the same channel (one Discord route bucket) are sent one
+    after another, messages to different channels are sent concurrently by
+    a pool of workers. A channel hitting a 429 is parked until its bucket
+    resets while the workers carry on with the other channels.
+    """
+    def __init__(self, client, workers=ANNOUNCE_WORKERS,
+                 retries=ANNOUNCE_RETRIES):
+        self.client = client
+        self.worker_count = workers
+        self.retries = retries
+        self._pending = {}
+        self._busy = set()
+        self._ready = None
+        self._workers = []
+
+    def start(self):
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        self._workers = [self.client.loop.create_task(self._worker())
+                         for __ in range(self.worker_count)]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        for announcements in self._pending.values():
+            for announcement in announcements:
+                announcement.future.cancel()
+        self._pending.clear()
+        self._busy.clear()
+
+    def announce(self, channel_id, content):
+        """Queue a message, returns a future resolving to whether it was
+        delivered
+        """
+        self.start()
+        future = self.client.loop.create_future()
+        self._pending.setdefault(channel_id, deque()).append(
+            Announcement(channel_id, content, future))
+        self._schedule(channel_id)
+        return future
+
+    async def announce_many(self, announcements):
+        """Send (channel_id, content) pairs, returns the delivery result of
+        each one in order
+        """
+        futures = [self.announce(channel_id, content)
+                   for channel_id, content in announcements]
+        return await asyncio.gather(*futures)
+
+    def _schedule(self, channel_id):
+        if channel_id not in self._busy and self._pending.get(channel_id):
+            self._busy.add(channel_id)
+            self._ready.put_nowait(channel_id)
+
+    def _release(self, channel_id, delay=0):
+        def release():
+            self._busy.discard(channel_id)
+            self._schedule(channel_id)
+        if delay:
+            self.client.loop.call_later(delay, release)
+        else:
+            release()
+
+    async def _worker(self):
+        while True:
+            channel_id = await self._ready.get()
+            announcements = self._pending[channel_id]
+            announcement = announcements[0]
+            delay = await self._send(announcement)
+            if delay is None:
+                announcements.popleft()
+                if not announcements:
+                    del self._pending[channel_id]
+            self._release(channel_id, delay or 0)
+
+    async def _send(self, announcement):
+        """Try to deliver an announcement, returns None once it is settled or
+        the number of seconds to wait before retrying it
+        """
+        announcement.attempts += 1
+        try:
+            await self.client.send_message(announcement.channel_id,
+                                           announcement.content)
+        except HTTPException as exception:
+            retryable = exception.status == 429 or exception.status >= 500
+            if retryable and announcement.attempts <= self.retries:
+                delay = 2 ** announcement.attempts
+                if exception.status == 429:
+                    delay = float(exception.response.headers.get(
+                        "Retry-After", delay))
+                LOG.info("Announcement to %s failed with %d, retrying in "
+                         "%.1fs", announcement.channel_id, exception.status,
+                         delay)
+                return delay
+            LOG.exception(exception)
+            announcement.settle(False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+            announcement.settle(False)
+        else:
+            announcement.settle(True)
+        return None
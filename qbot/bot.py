@@ -1,23 +1,53 @@
 import logging
 
-import aiosqlite
 import discord
 from discord.channel import DMChannel, TextChannel
 
+from qbot import config
+from qbot.announcer import Announcer
 from qbot.config import DB_PATH
 from qbot.database import Db
+from qbot.dispatcher import Dispatcher
+from qbot.messagecache import MessageCache
+from qbot.metrics import handle_metrics, monitor_loop_lag
 from qbot.pluginmanager import PluginManager
+from qbot.scheduler import Scheduler
+from qbot.settings import SettingsCache
+from qbot.sharding import ShardLink
+from qbot.web import WebClient
+from qbot.webhooks import WebhookServer
 
 LOG = logging.getLogger("discord")
+# Serve /metrics in the Prometheus text format on this port if set
+METRICS_HOST = getattr(config, "METRICS_HOST", "127.0.0.1")
+METRICS_PORT = getattr(config, "METRICS_PORT", None)
 
 class QBot(discord.Client):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, ipc_path=None, **kwargs):
         super().__init__(*args, **kwargs)
+        # Shards run by this process, set by AutoShardedClient
+        shard_ids = getattr(self, "shard_ids", None) or [self.shard_id or 0]
+        self.link = ShardLink(shard_ids, self.shard_count or 1, ipc_path)
         self.db = Db(DB_PATH, self.loop)  # pylint: disable=C0103
+        self.web = WebClient()
+        self.settings = SettingsCache(self.db)
+        self.announcer = Announcer(self)
+        self.scheduler = Scheduler(self)
+        self.webhooks = WebhookServer()
+        metrics_port = METRICS_PORT
+        if METRICS_PORT and self.link.partitioned:
+            # One port per process, offset by its first shard
+            metrics_port += min(self.link.shard_ids)
+        self.metrics_server = WebhookServer(METRICS_HOST, metrics_port,
+                                            "metrics")
+        if METRICS_PORT:
+            self.metrics_server.add_route("GET", "/metrics", handle_metrics)
+        self._lag_monitor = self.loop.create_task(monitor_loop_lag())
         self.plugins = []
+        self.dispatcher = Dispatcher(self)
         self.plugin_manager = PluginManager(self)
         self.plugin_manager.load_all()
-        self.last_messages = []
+        self.message_cache = MessageCache()
 
         if self.shard_id is not None:
             self.shard = [self.shard_id, self.shard_count]
@@ -35,9 +65,28 @@ class QBot(discord.Client):
         LOG.info("Logged in")
 
         await self.add_all_guilds()
+        await self.settings.load()
+        self.link.start(self.loop)
+        # Push notifications are received by one process only
+        if self.link.primary:
+            await self.webhooks.start()
+        await self.metrics_server.start()
         for plugin in self.plugins:
             self.loop.create_task(plugin.on_ready())
 
+    async def close(self):
+        await super().close()
+        await self.link.close()
+        await self.scheduler.close()
+        await self.webhooks.close()
+        await self.metrics_server.close()
+        self._lag_monitor.cancel()
+        for plugin in self.plugins:
+            await plugin.close()
+        await self.announcer.close()
+        await self.web.close()
+        await self.db.close()
+
     def get_plugins(self):
         return self.plugins
 
@@ -51,12 +100,24 @@ class QBot(discord.Client):
         if isinstance(message.channel, DMChannel):
             return
 
-        if message.author.__class__ != discord.Member:
+        self.message_cache.add(message)
+        if not isinstance(message.author, discord.Member):
             return
 
-        # pylint: disable=W0212
-        for plugin in self.plugins:
-            self.loop.create_task(plugin._on_message(message))
+        await self.dispatcher.dispatch(message)
+
+    async def on_raw_message_edit(self, payload):
+        if "content" in payload.data:
+            self.message_cache.edit(int(payload.data["channel_id"]),
+                                    payload.message_id,
+                                    payload.data["content"])
+
+    async def on_raw_message_delete(self, payload):
+        self.message_cache.remove(payload.channel_id, payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.message_cache.remove(payload.channel_id, message_id)
 
     async def send_files(self, files, *args, **kwargs):
         return await self.http.send_files(files=files, *args, **kwargs)
@@ -64,21 +125,26 @@ class QBot(discord.Client):
     async def add_all_guilds(self):
         """Syncing all the guilds to the DB"""
         LOG.debug("Syncing guilds and db")
+        rows = []
         for guild in self.guilds:
             LOG.debug("Adding guild %d's id to db", guild.id)
-            # pylint: disable=W0212
-            for channel_id in guild._channels:
-                if (isinstance(guild._channels[channel_id], TextChannel) and
-                        guild._channels[channel_id].name == "general"):
-                    announcement_channel = channel_id
+            text_channels = [channel for channel in guild.channels
+                             if isinstance(channel, TextChannel)]
+            if not text_channels:
+                continue
+            announcement_channel = text_channels[0].id
+            for channel in text_channels:
+                if channel.name == "general":
+                    announcement_channel = channel.id
                     break
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(
-                    "INSERT OR IGNORE INTO guilds ("
-                    "id,name,streamers_channel,streamers_text,"
-                    "youtubers_channel,youtubers_text) VALUES(?,?,?,?,?,?)",
-                    (guild.id, guild.name, announcement_channel,
-                     "{streamer} is now live! {link}",
-                     announcement_channel,
-                     "{youtuber} uploaded a new video! {link}"))
-                await conn.commit()
+            rows.append((guild.id, guild.name, announcement_channel,
+                         "{streamer} is now live! {link}",
+                         announcement_channel,
+                         "{youtuber} uploaded a new video! {link}"))
+        await self.db.executemany(
+            "INSERT OR IGNORE INTO guilds ("
+            "id,name,streamers_channel,streamers_text,"
+            "youtubers_channel,youtubers_text) VALUES(?,?,?,?,?,?)", rows)
+
+class ShardedQBot(QBot, discord.AutoShardedClient):
+    """QBot running several shards, given as shard_ids, in one process"""
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+LOG = logging.getLogger("discord")
+
+class BrowserBusy(Exception):
+    """Raised when too many screenshots are already waiting for a browser"""
+
+class BrowserPool:
+    """Long-lived headless Chrome instances driven from worker threads.
+
+    Each worker thread starts its own browser on first use and keeps it
+    for the next requests, so a screenshot only pays for the page load.
+    At most size screenshots run at once, up to max_waiting more wait in
+    line and anything beyond that is turned away with BrowserBusy.
+    """
+    def __init__(self, size, max_waiting):
+        self.size = size
+        self.max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=size)
+        self._local = threading.local()
+        self._drivers = []
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    def _get_driver(self):
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            # selenium is slow to import, only pay for it once it's needed
+            from selenium import webdriver
+            chrome_options = webdriver.ChromeOptions()
+            chrome_options.add_argument("--headless")
+            chrome_options.add_argument("--hide-scrollbars")
+            chrome_options.add_argument("--log-level=3")
+            driver = webdriver.Chrome(options=chrome_options)
+            self._local.driver = driver
+            with self._lock:
+                self._drivers.append(driver)
+        return driver
+
+    def _drop_driver(self):
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            return
+        self._local.driver = None
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:  # pylint: disable=W0703
+            pass
+
+    def _screenshot(self, url, element_id):
+        driver = self._get_driver()
+        try:
+            driver.get(url)
+            if element_id:
+                from selenium.webdriver.common.action_chains import (
+                    ActionChains)
+                element = driver.find_element_by_id(element_id)
+                ActionChains(driver).move_to_element(element).perform()
+            return driver.get_screenshot_as_png()
+        except Exception:
+            # Don't hand a browser in an unknown state to the next request
+            self._drop_driver()
+            raise
+
+    async def screenshot(self, url, element_id=None):
+        """Return a PNG screenshot of url, scrolled to element_id if given"""
+        if self._waiting >= self.size + self.max_waiting:
+            raise BrowserBusy()
+        self._waiting += 1
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                self._executor, self._screenshot, url, element_id)
+        finally:
+            self._waiting -= 1
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:  # pylint: disable=W0703
+                pass
+        self._executor.shutdown(wait=False)
@@ -1,23 +1,247 @@
+import asyncio
+from contextlib import asynccontextmanager
 import logging
 
 import aiosqlite
 
+from qbot.metrics import DB_LATENCY, statement_label
+
 LOG = logging.getLogger("discord")
 
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+# Columns added to existing tables after they were first shipped
+ADDED_COLUMNS = (("state", "published", "TEXT"),)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guilds (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    streamers_channel INTEGER NOT NULL,
+    streamers_text TEXT NOT NULL,
+    youtubers_channel INTEGER NOT NULL,
+    youtubers_text TEXT NOT NULL,
+    mod_roles TEXT);
+CREATE TABLE IF NOT EXISTS channels (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    name TEXT,
+    PRIMARY KEY (platform, channel_id));
+-- the primary key doubles as the (platform, channel_id) fan-out index
+CREATE TABLE IF NOT EXISTS subscriptions (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    PRIMARY KEY (platform, channel_id, guild_id));
+CREATE INDEX IF NOT EXISTS subscriptions_guild ON subscriptions (guild_id);
+CREATE TABLE IF NOT EXISTS state (
+    platform TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    online INTEGER NOT NULL DEFAULT 0,
+    latest TEXT,
+    published TEXT,
+    PRIMARY KEY (platform, channel_id));
+CREATE TABLE IF NOT EXISTS search_cache (
+    provider TEXT NOT NULL,
+    query TEXT NOT NULL,
+    expires REAL NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (provider, query));
+"""
+READERS = 4
+CACHED_STATEMENTS = 256
+
+class TimedConnection(object):
+    """The writer connection as seen inside Db.transaction(), recording
+    the time of each statement
+    """
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def execute(self, sql, params=()):
+        with DB_LATENCY.time(statement_label(sql)):
+            return await self._conn.execute(sql, params)
+
+    async def executemany(self, sql, seq_of_params):
+        with DB_LATENCY.time(statement_label(sql)):
+            return await self._conn.executemany(sql, seq_of_params)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
 class Db(object):
-    def __init__(self, db_path, loop):
+    """Long-lived SQLite connections shared by the whole bot.
+
+    Writes go through a single connection guarded by a lock, reads are
+    spread over a small pool of reader connections. WAL mode lets readers
+    run while a write transaction is open.
+    """
+    def __init__(self, db_path, loop, readers=READERS):
         self.loop = loop
         self.path = db_path
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        self._reader_count = readers
+        self._ready = asyncio.Event()
         self.loop.create_task(self.create())
 
+    async def wait_until_ready(self):
+        await self._ready.wait()
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.path,
+                                       cached_statements=CACHED_STATEMENTS)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
     async def create(self):
-        async with aiosqlite.connect(self.path) as conn:
-            await conn.execute("CREATE TABLE IF NOT EXISTS guilds ("
-                               "id INTEGER PRIMARY KEY,"
-                               "name TEXT NOT NULL,"
-                               "streamers_channel INTEGER NOT NULL,"
-                               "streamers_text TEXT NOT NULL,"
-                               "youtubers_channel INTEGER NOT NULL,"
-                               "youtubers_text TEXT NOT NULL,"
-                               "mod_roles TEXT);")
-            await conn.commit()
+        self._writer = await self._connect()
+        for __ in range(self._reader_count):
+            self._readers.put_nowait(await self._connect())
+        await self._writer.executescript(SCHEMA)
+        await self._writer.commit()
+        await self.add_columns()
+        await self.migrate()
+        self._ready.set()
+
+    async def add_columns(self):
+        """Add the ADDED_COLUMNS missing from a DB created before them"""
+        for table, column, declaration in ADDED_COLUMNS:
+            cursor = await self._writer.execute(f"PRAGMA table_info({table})")
+            columns = [row[1] for row in await cursor.fetchall()]
+            await cursor.close()
+            if column not in columns:
+                LOG.info("Adding %s.%s", table, column)
+                await self._writer.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        await self._writer.commit()
+
+    async def migrate(self):
+        """Move the rows of the legacy per-guild streamers_{id} and
+        youtubers_{id} tables into the shared subscription tables and drop
+        them
+        """
+        cursor = await self._writer.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND "
+            "(name LIKE 'streamers_%' OR name LIKE 'youtubers_%')")
+        tables = [row[0] for row in await cursor.fetchall()]
+        await cursor.close()
+        tables = [table for table in tables
+                  if table.split("_", 1)[1].isdigit()]
+        if not tables:
+            return
+        LOG.info("Migrating %d per-guild tables", len(tables))
+        conn = self._writer
+        try:
+            for table in tables:
+                kind, guild_id = table.split("_", 1)
+                if kind == "streamers":
+                    await conn.execute(
+                        "INSERT OR IGNORE INTO channels "
+                        "(platform,channel_id,name) "
+                        f"SELECT 'twitch',user_id,name FROM {table}")
+                    await conn.execute(
+                        "INSERT OR IGNORE INTO state "
+                        "(platform,channel_id,online) "
+                        f"SELECT 'twitch',user_id,online FROM {table}")
+                    await conn.execute(
+                        "INSERT OR IGNORE INTO subscriptions "
+                        "(platform,channel_id,guild_id) "
+                        f"SELECT 'twitch',user_id,{guild_id} FROM {table}")
+                else:
+                    await conn.execute(
+                        "INSERT OR IGNORE INTO channels (platform,channel_id) "
+                        f"SELECT 'youtube',id FROM {table}")
+                    await conn.execute(
+                        "INSERT OR IGNORE INTO state "
+                        "(platform,channel_id,latest) "
+                        f"SELECT 'youtube',id,latest FROM {table}")
+                    await conn.execute(
+                        "INSERT OR IGNORE INTO subscriptions "
+                        "(platform,channel_id,guild_id) "
+                        f"SELECT 'youtube',id,{guild_id} FROM {table}")
+                await conn.execute(f"DROP TABLE {table}")
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+
+    async def close(self):
+        if not self._ready.is_set():
+            return
+        self._ready.clear()
+        while not self._readers.empty():
+            await self._readers.get_nowait().close()
+        async with self._write_lock:
+            await self._writer.close()
+
+    @asynccontextmanager
+    async def _reader(self):
+        await self.wait_until_ready()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _transaction(self):
+        await self.wait_until_ready()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run several statements on the writer, committed together.
+        Rolls back if the block raises.
+        """
+        async with self._transaction() as conn:
+            yield TimedConnection(conn)
+
+    async def fetch(self, sql, params=()):
+        """Return all the rows of a query"""
+        with DB_LATENCY.time(statement_label(sql)):
+            async with self._reader() as conn:
+                cursor = await conn.execute(sql, params)
+                rows = await cursor.fetchall()
+                await cursor.close()
+        return rows
+
+    async def fetchone(self, sql, params=()):
+        """Return the first row of a query or None"""
+        with DB_LATENCY.time(statement_label(sql)):
+            async with self._reader() as conn:
+                cursor = await conn.execute(sql, params)
+                row = await cursor.fetchone()
+                await cursor.close()
+        return row
+
+    async def execute(self, sql, params=()):
+        """Run a single write statement in its own transaction and return
+        the number of affected rows
+        """
+        with DB_LATENCY.time(statement_label(sql)):
+            async with self._transaction() as conn:
+                cursor = await conn.execute(sql, params)
+                rowcount = cursor.rowcount
+                await cursor.close()
+        return rowcount
+
+    async def executemany(self, sql, seq_of_params):
+        """Run a write statement for every set of params in one
+        transaction
+        """
+        with DB_LATENCY.time(statement_label(sql)):
+            async with self._transaction() as conn:
+                await conn.executemany(sql, seq_of_params)
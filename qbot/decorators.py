@@ -1,37 +1,35 @@
-import asyncio
 from functools import wraps
 import logging
 import re
+import time
 
 from qbot.const import PREFIX
+from qbot.metrics import COMMAND_ERRORS, COMMAND_LATENCY
 
 LOG = logging.getLogger("discord")
+TRIGGER_RE = re.compile(r"\^?" + re.escape(PREFIX) + r"(\w+)(?:$| |\\s)")
 
 def bg_task(sleep_time, ignore_errors=True):
+    """Mark a plugin method to be run every sleep_time seconds by the
+    client's scheduler
+    """
     def actual_decorator(func):
-        @wraps(func)
-        async def wrapper(self):
-            await self.client.wait_until_ready()
-            await self.wait_until_ready()
-            while True:
-                if ignore_errors:
-                    try:
-                        await func(self)
-                    except Exception as exception:  # pylint: disable=W0703
-                        LOG.info("An error occured in the %s bg task "
-                                 "retrying in %d seconds", func.__name__,
-                                 sleep_time)
-                        LOG.exception(exception)
-                else:
-                    await func(self)
-
-                await asyncio.sleep(sleep_time)
-
-        wrapper._bg_task = True  # pylint: disable=W0212
-        return wrapper
+        func._bg_task = True  # pylint: disable=W0212
+        func.interval = sleep_time
+        func.ignore_errors = ignore_errors
+        return func
 
     return actual_decorator
 
+def get_trigger(pattern):
+    """Extract the literal command name a pattern starts with, e.g.
+    "^~purge (.*)" -> "purge". Returns None when the pattern does not begin
+    with a plain PREFIX + word, in which case the command is tried on every
+    prefixed message.
+    """
+    match = TRIGGER_RE.match(pattern)
+    return match.group(1) if match else None
+
 def command(pattern=None, user_check=None, description="", usage=None):
     def actual_decorator(func):
         name = func.__name__
@@ -62,8 +60,16 @@ def command(pattern=None, user_check=None, description="", usage=None):
                      message.author.discriminator, message.guild.name,
                      message.clean_content)
 
-            await func(self, message, args)
+            start = time.perf_counter()
+            try:
+                await func(self, message, args)
+            except Exception:
+                COMMAND_ERRORS.inc(name)
+                raise
+            finally:
+                COMMAND_LATENCY.observe(time.perf_counter() - start, name)
         wrapper._is_command = True  # pylint: disable=W0212
+        wrapper.trigger = get_trigger(pattern or cmd_name)
         if usage:
             command_name = usage
         else:
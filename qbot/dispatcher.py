@@ -0,0 +1,61 @@
+import logging
+
+from qbot.const import PREFIX
+from qbot.plugin import Plugin
+
+LOG = logging.getLogger("discord")
+
+class Dispatcher:
+    """Routes guild messages to the plugins interested in them.
+
+    Commands are indexed by their trigger (the first token after PREFIX) so
+    a message only ever runs the regex of the command it names, and
+    messages without PREFIX never reach a command at all.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.commands = {}
+        self.fallback = []
+        self.listeners = []
+
+    def build(self, plugins):
+        """(Re)build the command index from the loaded plugins"""
+        commands = {}
+        fallback = []
+        listeners = []
+        for plugin in plugins:
+            for func in plugin.commands.values():
+                if func.trigger is None:
+                    fallback.append((plugin, func))
+                else:
+                    commands.setdefault(func.trigger, []).append(
+                        (plugin, func))
+            # Only wake up plugins which actually handle raw messages
+            if type(plugin).on_message is not Plugin.on_message:
+                listeners.append(plugin)
+        self.commands = commands
+        self.fallback = fallback
+        self.listeners = listeners
+        LOG.info("Indexed %d command triggers / %d message listeners",
+                 len(self.commands), len(self.listeners))
+
+    def lookup(self, content):
+        """Return the (plugin, command) pairs which may handle content"""
+        if not content.startswith(PREFIX):
+            return []
+        trigger = content[len(PREFIX):].split(None, 1)
+        if not trigger:
+            return self.fallback
+        matches = self.commands.get(trigger[0], [])
+        return matches + self.fallback if self.fallback else matches
+
+    async def dispatch(self, message):
+        for plugin in self.listeners:
+            self.client.loop.create_task(plugin.on_message(message))
+
+        matches = self.lookup(message.content)
+        if not matches:
+            return
+        # pylint: disable=W0212
+        for plugin, func in matches:
+            await plugin._on_message(message, [func])
@@ -0,0 +1,116 @@
+"""Receiving end of Twitch EventSub webhooks.
+
+See https://dev.twitch.tv/docs/eventsub/handling-webhook-events
+"""
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import json
+import logging
+
+from aiohttp import web
+
+LOG = logging.getLogger("discord")
+
+MESSAGE_ID = "Twitch-Eventsub-Message-Id"
+MESSAGE_TIMESTAMP = "Twitch-Eventsub-Message-Timestamp"
+MESSAGE_SIGNATURE = "Twitch-Eventsub-Message-Signature"
+MESSAGE_TYPE = "Twitch-Eventsub-Message-Type"
+
+VERIFICATION = "webhook_callback_verification"
+NOTIFICATION = "notification"
+REVOCATION = "revocation"
+
+# Twitch asks to drop messages older than this, they may be replayed
+MAX_MESSAGE_AGE = 10 * 60
+SEEN_MESSAGES = 1000
+
+def sign(secret, message_id, timestamp, body):
+    """Return the signature header value of a message"""
+    digest = hmac.new(secret.encode(), message_id.encode() +
+                      timestamp.encode() + body, hashlib.sha256)
+    return "sha256=" + digest.hexdigest()
+
+def verify_signature(secret, headers, body):
+    try:
+        expected = sign(secret, headers[MESSAGE_ID],
+                        headers[MESSAGE_TIMESTAMP], body)
+        return hmac.compare_digest(expected, headers[MESSAGE_SIGNATURE])
+    except KeyError:
+        return False
+
+def message_age(timestamp):
+    """Seconds since an RFC3339 timestamp such as
+    2019-11-16T10:11:12.634234626Z
+    """
+    sent = datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S")
+    sent = sent.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - sent).total_seconds()
+
+class EventSubReceiver:
+    """aiohttp handler for an EventSub callback URL.
+
+    Answers the challenge of new subscriptions, and hands notifications
+    and revocations over to on_notification(subscription_type, event) and
+    on_revocation(subscription) without making Twitch wait for them.
+    """
+    def __init__(self, secret, on_notification, on_revocation=None):
+        self.secret = secret
+        self.on_notification = on_notification
+        self.on_revocation = on_revocation
+        self._seen = OrderedDict()
+
+    def _is_duplicate(self, message_id):
+        if message_id in self._seen:
+            return True
+        self._seen[message_id] = None
+        if len(self._seen) > SEEN_MESSAGES:
+            self._seen.popitem(last=False)
+        return False
+
+    @staticmethod
+    async def _run(callback, *args):
+        try:
+            await callback(*args)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+
+    async def handle(self, request):
+        body = await request.read()
+        headers = request.headers
+        if not verify_signature(self.secret, headers, body):
+            LOG.info("Dropped EventSub message with a bad signature")
+            return web.Response(status=403)
+        try:
+            too_old = message_age(headers[MESSAGE_TIMESTAMP]) > MAX_MESSAGE_AGE
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if too_old:
+            LOG.info("Dropped stale EventSub message %s",
+                     headers[MESSAGE_ID])
+            return web.Response(status=403)
+
+        message_type = headers.get(MESSAGE_TYPE)
+        subscription = payload.get("subscription", {})
+        if message_type == VERIFICATION:
+            LOG.info("Verified EventSub subscription %s to %s",
+                     subscription.get("id"), subscription.get("type"))
+            return web.Response(text=payload["challenge"],
+                                content_type="text/plain")
+        if self._is_duplicate(headers[MESSAGE_ID]):
+            return web.Response(status=204)
+        if message_type == NOTIFICATION:
+            asyncio.ensure_future(self._run(
+                self.on_notification, subscription["type"],
+                payload["event"]))
+        elif message_type == REVOCATION:
+            LOG.info("EventSub subscription %s to %s revoked: %s",
+                     subscription.get("id"), subscription.get("type"),
+                     subscription.get("status"))
+            if self.on_revocation is not None:
+                asyncio.ensure_future(self._run(self.on_revocation,
+                                                subscription))
+        return web.Response(status=204)
@@ -0,0 +1,196 @@
+"""Run the bot as several supervised processes.
+
+    python -m qbot.launcher [processes]
+
+Splits the SHARD_COUNT shards over processes (one per shard by default),
+starts them one after the other, restarts any that exits and routes the
+messages they exchange over a unix socket.
+"""
+import argparse
+import asyncio
+from collections import defaultdict, deque
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from qbot import config
+from qbot.sharding import IPC_FRAME_LIMIT, encode, read_frames, split_shards
+
+LOG = logging.getLogger("discord")
+
+SHARD_COUNT = int(getattr(config, "SHARD_COUNT", 1))
+SHARD_PROCESSES = getattr(config, "SHARD_PROCESSES", None)
+IPC_PATH = getattr(config, "IPC_PATH", os.path.join(
+    tempfile.gettempdir(), "qbot-{}.sock".format(os.getpid())))
+# Discord allows one gateway identify every 5 seconds
+IDENTIFY_INTERVAL = 5
+RESTART_DELAY = 5
+MAX_RESTART_DELAY = 5 * 60
+# A process which stayed up that long is considered healthy again
+STABLE_AFTER = 10 * 60
+# Messages kept for a shard whose process is restarting
+HUB_BACKLOG = 1000
+
+class Hub:
+    """Routes the frames of the shard processes.
+
+    A "send" frame, request and reply frames included, goes to the process
+    running its shard, and is kept until that process is back if it is
+    restarting. Requests are answered with None instead, their sender
+    would have given up by then. A "broadcast" frame goes to every other
+    process.
+    """
+    def __init__(self):
+        self.writers = {}
+        self.pending = defaultdict(lambda: deque(maxlen=HUB_BACKLOG))
+
+    async def handle(self, reader, writer):
+        shards = []
+        try:
+            async for frame in read_frames(reader):
+                op = frame.get("op")
+                if op == "hello":
+                    shards = frame["shards"]
+                    for shard in shards:
+                        self.writers[shard] = writer
+                        while self.pending[shard]:
+                            writer.write(self.pending[shard].popleft())
+                elif op == "send":
+                    self.route(frame)
+                elif op == "broadcast":
+                    data = encode({"event": frame["event"],
+                                   "data": frame["data"]})
+                    for other in set(self.writers.values()):
+                        if other is not writer:
+                            other.write(data)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.info("Dropping the connection of shard(s) %s: %r",
+                     ",".join(map(str, shards)), exception)
+        finally:
+            for shard in shards:
+                if self.writers.get(shard) is writer:
+                    del self.writers[shard]
+            writer.close()
+
+    def route(self, frame):
+        shard = frame["shard"]
+        writer = self.writers.get(shard)
+        if writer is None and "id" in frame:
+            self.route({"shard": frame["from"], "reply": frame["id"],
+                        "data": None})
+            return
+        data = encode({key: value for key, value in frame.items()
+                       if key not in ("op", "shard")})
+        if writer is None:
+            self.pending[shard].append(data)
+        else:
+            writer.write(data)
+
+class Launcher:
+    def __init__(self, groups, shard_count, ipc_path):
+        self.groups = groups
+        self.shard_count = shard_count
+        self.ipc_path = ipc_path
+        self.hub = Hub()
+        self.processes = {}
+        self.tasks = {}
+        self.stopping = False
+
+    async def supervise(self, name, delay):
+        """Keep a process running the shards of name, e.g. "0,1",
+        restarting it with a growing delay each time it exits soon after
+        starting
+        """
+        await asyncio.sleep(delay)
+        restart_delay = RESTART_DELAY
+        while not self.stopping:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "qbot.launcher", "--shards", name,
+                "--ipc", self.ipc_path)
+            self.processes[name] = process
+            LOG.info("Started shard(s) %s, pid %d", name, process.pid)
+            started = time.monotonic()
+            code = await process.wait()
+            del self.processes[name]
+            if self.stopping:
+                return
+            if time.monotonic() - started > STABLE_AFTER:
+                restart_delay = RESTART_DELAY
+            LOG.info("Shard(s) %s exited with %d, restarting in %d seconds",
+                     name, code, restart_delay)
+            await asyncio.sleep(restart_delay)
+            restart_delay = min(restart_delay * 2, MAX_RESTART_DELAY)
+
+    async def run(self):
+        if os.path.exists(self.ipc_path):
+            os.unlink(self.ipc_path)
+        server = await asyncio.start_unix_server(
+            self.hub.handle, self.ipc_path, limit=IPC_FRAME_LIMIT)
+        loop = asyncio.get_event_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+        LOG.info("Running %d shard(s) in %d process(es)", self.shard_count,
+                 len(self.groups))
+        delay = 0
+        for shard_ids in self.groups:
+            name = ",".join(map(str, shard_ids))
+            self.tasks[name] = loop.create_task(self.supervise(name, delay))
+            delay += IDENTIFY_INTERVAL * len(shard_ids)
+        try:
+            await asyncio.gather(*self.tasks.values(),
+                                 return_exceptions=True)
+        finally:
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(self.ipc_path):
+                os.unlink(self.ipc_path)
+
+    def stop(self):
+        LOG.info("Stopping every shard")
+        self.stopping = True
+        for name, task in self.tasks.items():
+            process = self.processes.get(name)
+            if process is not None:
+                process.terminate()
+            else:
+                # Waiting to start or restart its process
+                task.cancel()
+
+def run_shards(shard_ids, shard_count, ipc_path):
+    """Run shard_ids in this process"""
+    # Imported here so the launcher itself doesn't load the plugins
+    from qbot.bot import QBot, ShardedQBot
+    if len(shard_ids) == 1:
+        bot = QBot(shard_id=shard_ids[0], shard_count=shard_count,
+                   ipc_path=ipc_path)
+    else:
+        bot = ShardedQBot(shard_ids=shard_ids, shard_count=shard_count,
+                          ipc_path=ipc_path)
+    bot.run(config.TOKEN)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("processes", type=int, nargs="?",
+                        default=SHARD_PROCESSES or SHARD_COUNT)
+    parser.add_argument("--shards", help=argparse.SUPPRESS)
+    parser.add_argument("--ipc", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.shards is not None:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="[shard " + args.shards + "] %(levelname)s:%(message)s")
+        run_shards([int(shard) for shard in args.shards.split(",")],
+                   SHARD_COUNT, args.ipc)
+        return
+    logging.basicConfig(level=logging.INFO,
+                        format="[launcher] %(levelname)s:%(message)s")
+    launcher = Launcher(split_shards(SHARD_COUNT, args.processes),
+                        SHARD_COUNT, IPC_PATH)
+    asyncio.get_event_loop().run_until_complete(launcher.run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Offline SQLite FTS5 index answering ~wiki and ~urbandict.
+
+Build or rebuild the index from dump files with
+    python -m qbot.localindex wiki enwiki-latest-all-titles-in-ns0.gz
+    python -m qbot.localindex urbandict urbandict.jsonl.gz
+The wiki dump is one page title per line, the Urban Dictionary dump is
+one JSON object per line with the word, definition, example and
+permalink fields of the API. Both may be gzip compressed.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+from urllib.parse import quote
+
+import aiosqlite
+
+LOG = logging.getLogger("discord")
+
+INDEX_PATH = "index.db"
+CHUNK_SIZE = 10000
+WIKI_URL = "https://en.wikipedia.org/wiki/"
+SCHEMAS = {
+    "wiki": "CREATE VIRTUAL TABLE wiki USING fts5(title)",
+    "urbandict": "CREATE VIRTUAL TABLE urbandict USING fts5("
+                 "word, definition, example, permalink UNINDEXED)",
+}
+
+def match_expression(query):
+    """Quote every word of query so FTS5 syntax in it is taken literally"""
+    return " ".join('"' + word.replace('"', '""') + '"'
+                    for word in query.split())
+
+class LocalIndex:
+    """Read-only connection to the index, opened on first lookup.
+
+    Lookups return None when nothing matches or the index is missing, so
+    the caller can fall back to the remote API.
+    """
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._conn = None
+
+    async def _fetchone(self, sql, query):
+        expression = match_expression(query)
+        if not expression:
+            return None
+        if self._conn is None:
+            if not os.path.exists(self.path):
+                return None
+            self._conn = await aiosqlite.connect(
+                "file:{}?mode=ro".format(quote(self.path)), uri=True)
+        try:
+            cursor = await self._conn.execute(sql, (expression,))
+            row = await cursor.fetchone()
+            await cursor.close()
+        except sqlite3.OperationalError as exception:
+            # Most likely that part of the index hasn't been imported
+            LOG.info("Local index lookup failed: %s", exception)
+            return None
+        return row
+
+    async def wiki(self, query):
+        """Return the URL of the best matching Wikipedia page"""
+        row = await self._fetchone(
+            "SELECT title FROM wiki WHERE wiki MATCH ? "
+            "ORDER BY bm25(wiki), length(title) LIMIT 1", query)
+        if row is None:
+            return None
+        return WIKI_URL + quote(row[0].replace(" ", "_"))
+
+    async def urbandict(self, query):
+        """Return the best matching definition as a dict shaped like an
+        Urban Dictionary API result
+        """
+        # A hit on the word itself outweighs one in the definition
+        row = await self._fetchone(
+            "SELECT word, definition, example, permalink FROM urbandict "
+            "WHERE urbandict MATCH ? "
+            "ORDER BY bm25(urbandict, 10.0, 1.0, 0.5, 0.0) LIMIT 1", query)
+        if row is None:
+            return None
+        return dict(zip(("word", "definition", "example", "permalink"), row))
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+def _open_dump(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+def read_wiki(dump):
+    for line in dump:
+        title = line.rstrip("\n")
+        # The titles dump starts with a "page_title" header
+        if title and title != "page_title":
+            yield (title.replace("_", " "),)
+
+def read_urbandict(dump):
+    for line in dump:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        yield (entry["word"], entry["definition"], entry.get("example", ""),
+               entry.get("permalink", ""))
+
+READERS = {"wiki": read_wiki, "urbandict": read_urbandict}
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def build(index_path, table, dump_path, chunk_size=CHUNK_SIZE):
+    """Replace table in the index with the rows of dump_path, return the
+    number of rows imported
+    """
+    conn = sqlite3.connect(index_path)
+    # Nothing to recover if the import dies halfway, just run it again
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    count = 0
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS " + table)
+            conn.execute(SCHEMAS[table])
+        with _open_dump(dump_path) as dump:
+            for chunk in _chunks(READERS[table](dump), chunk_size):
+                sql = "INSERT INTO {} VALUES({})".format(
+                    table, ",".join("?" * len(chunk[0])))
+                with conn:
+                    conn.executemany(sql, chunk)
+                count += len(chunk)
+                LOG.info("Imported %d rows into %s", count, table)
+        with conn:
+            conn.execute(
+                "INSERT INTO {0}({0}) VALUES('optimize')".format(table))
+    finally:
+        conn.close()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the local search index from a dump file")
+    parser.add_argument("table", choices=sorted(SCHEMAS))
+    parser.add_argument("dump")
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+    count = build(args.index, args.table, args.dump, args.chunk_size)
+    LOG.info("Indexed %d %s rows in %.1fs", count, args.table,
+             time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from datetime import datetime
+import logging
+
+LOG = logging.getLogger("discord")
+
+MAX_CHANNELS = 500
+MAX_MESSAGES_PER_CHANNEL = 200
+
+class CachedMessage:  # pylint: disable=R0903
+    """The fields of a message the bot needs to quote it"""
+    __slots__ = ("id", "channel_id", "author_id", "author_name", "content",
+                 "created_at")
+
+    def __init__(self, id, channel_id, author_id, author_name, content,
+                 created_at):  # pylint: disable=W0622
+        self.id = id  # pylint: disable=C0103
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.content = content
+        self.created_at = created_at
+
+    @classmethod
+    def from_message(cls, message):
+        return cls(message.id, message.channel.id, message.author.id,
+                   message.author.name, message.content, message.created_at)
+
+    @classmethod
+    def from_payload(cls, data):
+        """Build from the raw JSON returned by the REST API"""
+        created_at = datetime.strptime(data["timestamp"][:19],
+                                       "%Y-%m-%dT%H:%M:%S")
+        return cls(int(data["id"]), int(data["channel_id"]),
+                   int(data["author"]["id"]), data["author"]["username"],
+                   data["content"], created_at)
+
+class MessageCache:
+    """Bounded LRU of the most recent messages of the most recently active
+    channels
+    """
+    def __init__(self, max_channels=MAX_CHANNELS,
+                 max_messages=MAX_MESSAGES_PER_CHANNEL):
+        self.max_channels = max_channels
+        self.max_messages = max_messages
+        self.hits = 0
+        self.misses = 0
+        self._channels = OrderedDict()
+
+    def __len__(self):
+        return sum(len(messages) for messages in self._channels.values())
+
+    def add(self, message):
+        self.put(CachedMessage.from_message(message))
+
+    def put(self, cached):
+        messages = self._channels.get(cached.channel_id)
+        if messages is None:
+            messages = self._channels[cached.channel_id] = OrderedDict()
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(cached.channel_id)
+        messages[cached.id] = cached
+        messages.move_to_end(cached.id)
+        if len(messages) > self.max_messages:
+            messages.popitem(last=False)
+
+    def get(self, channel_id, message_id):
+        messages = self._channels.get(channel_id)
+        cached = messages.get(message_id) if messages else None
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def edit(self, channel_id, message_id, content):
+        messages = self._channels.get(channel_id)
+        cached = messages.get(message_id) if messages else None
+        if cached is not None:
+            cached.content = content
+
+    def remove(self, channel_id, message_id):
+        messages = self._channels.get(channel_id)
+        if messages:
+            messages.pop(message_id, None)
+
+    def stats(self):
+        return {"channels": len(self._channels), "messages": len(self),
+                "hits": self.hits, "misses": self.misses}
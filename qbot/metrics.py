@@ -0,0 +1,205 @@
+"""In-process metrics, rendered in the Prometheus text format.
+
+The metrics below are module level so any part of the bot can record
+into them without being handed a registry.
+"""
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+import logging
+import time
+
+import aiohttp
+from aiohttp import web
+
+LOG = logging.getLogger("discord")
+
+# Seconds, from a cache hit to a slow external API
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+           30, 60)
+LOOP_LAG_INTERVAL = 1
+REGISTRY = []
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(
+        name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                          for name, value in zip(names, values)) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name + _labels(self.labels, labels), value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self.values = {}
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        # the +Inf bucket when value is above every bound
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, labels):
+        return sum(self.values[labels][:-1])
+
+    def quantile(self, q, labels):
+        """Upper bound of the bucket holding the q quantile"""
+        counts = self.values[labels]
+        rank = q * sum(counts[:-1])
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for labels, counts in sorted(self.values.items()):
+            seen = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                seen += count
+                yield (self.name + "_bucket" +
+                       _labels(self.labels + ("le",), labels + (bound,)),
+                       seen)
+            yield self.name + "_sum" + _labels(self.labels, labels), counts[-1]
+            yield self.name + "_count" + _labels(self.labels, labels), seen
+
+COMMAND_LATENCY = Histogram("qbot_command_seconds",
+                            "Time spent running a command", ("command",))
+COMMAND_ERRORS = Counter("qbot_command_errors_total",
+                         "Commands which raised", ("command",))
+BG_TASK_DURATION = Histogram("qbot_bg_task_seconds",
+                             "Time spent in a bg task run", ("task",))
+BG_TASK_OVERRUNS = Counter("qbot_bg_task_overruns_total",
+                           "bg task runs skipped because the previous one "
+                           "was still going", ("task",))
+BG_TASK_FAILURES = Counter("qbot_bg_task_failures_total",
+                           "bg task runs which raised", ("task",))
+HTTP_LATENCY = Histogram("qbot_http_request_seconds",
+                         "Outbound HTTP request time", ("host",))
+HTTP_RESPONSES = Counter("qbot_http_responses_total",
+                         "Outbound HTTP responses by status, 'error' when "
+                         "the request failed", ("host", "status"))
+DB_LATENCY = Histogram("qbot_db_statement_seconds",
+                       "Time spent running a SQLite statement, waiting for "
+                       "a connection included", ("statement",))
+LOOP_LAG = Histogram("qbot_loop_lag_seconds",
+                     "How late the event loop woke up a sleeping task")
+
+@lru_cache(maxsize=256)
+def statement_label(sql):
+    """Collapse the whitespace of sql, long statements are cut short"""
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= 80 else sql[:77] + "..."
+
+def render():
+    """Return every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append("# HELP {} {}".format(metric.name, metric.description))
+        lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+        for name, value in metric.samples():
+            lines.append("{} {}".format(name, value))
+    return "\n".join(lines) + "\n"
+
+async def handle_metrics(request):  # pylint: disable=W0613
+    return web.Response(
+        body=render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+def summary():
+    """Return a short human readable digest of the metrics"""
+    lines = []
+    for title, histogram in (("Commands", COMMAND_LATENCY),
+                             ("BG tasks", BG_TASK_DURATION),
+                             ("HTTP", HTTP_LATENCY)):
+        if not histogram.values:
+            continue
+        lines.append(title)
+        for labels in sorted(histogram.values):
+            lines.append("  {:<28} n={:<6} p50<={}s p99<={}s".format(
+                labels[0][:28], histogram.count(labels),
+                histogram.quantile(0.5, labels),
+                histogram.quantile(0.99, labels)))
+    errors = sum(COMMAND_ERRORS.values.values())
+    failures = sum(BG_TASK_FAILURES.values.values())
+    overruns = sum(BG_TASK_OVERRUNS.values.values())
+    lines.append("Command errors {}, bg task failures {}, overruns {}".format(
+        errors, failures, overruns))
+    if DB_LATENCY.values:
+        slowest = sorted(DB_LATENCY.values.items(),
+                         key=lambda item: item[1][-1], reverse=True)[:3]
+        lines.append("DB, most total time")
+        for labels, counts in slowest:
+            lines.append("  {:.3f}s {}".format(counts[-1], labels[0][:60]))
+    if LOOP_LAG.values:
+        lines.append("Loop lag p99<={}s".format(LOOP_LAG.quantile(0.99, ())))
+    return "\n".join(lines)
+
+def trace_config():
+    """aiohttp TraceConfig recording the latency and status of every
+    request of a session
+    """
+    async def on_request_start(session, context, params):
+        # pylint: disable=W0613
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        # pylint: disable=W0613
+        host = params.url.host
+        HTTP_LATENCY.observe(time.perf_counter() - context.start, host)
+        HTTP_RESPONSES.inc(host, str(params.response.status))
+
+    async def on_request_exception(session, context, params):
+        # pylint: disable=W0613
+        HTTP_RESPONSES.inc(params.url.host, "error")
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Sleep for interval over and over, recording how late each wake up
+    was
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0, loop.time() - expected))
@@ -31,15 +31,38 @@ class Plugin(object, metaclass=PluginMount):
             # registering bg_tasks
             if hasattr(member, "_bg_task"):
                 self.bg_tasks[member.__name__] = member
-                self.client.loop.create_task(member())
+                self.client.scheduler.register(
+                    "{}.{}".format(type(self).__name__, member.__name__),
+                    member, member.interval, member.ignore_errors,
+                    self.wait_until_ready)
         LOG.info("Registered %d commands / %d bg tasks", len(self.commands),
                  len(self.bg_tasks))
 
+    async def wait_until_ready(self):
+        """Wait until the plugin is ready to run its bg tasks"""
+        pass
+
+    def get_help_info(self):
+        return {
+            "name": type(self).__name__,
+            "fancy_name": self.fancy_name or type(self).__name__,
+            "commands": [cmd.info for cmd in self.commands.values()]
+        }
+
     async def on_ready(self):
         pass
 
-    async def _on_message(self, message):
-        for __, func in self.commands.items():
+    async def close(self):
+        """Called when the bot shuts down"""
+        pass
+
+    async def _on_message(self, message, commands=None):
+        """Run the given commands (all of them by default) on message. The
+        client's dispatcher only passes the commands the message names.
+        """
+        if commands is None:
+            commands = self.commands.values()
+        for func in commands:
             try:
                 await func(message)
             except Forbidden:
@@ -47,8 +70,6 @@ class Plugin(object, metaclass=PluginMount):
                        "to do that 😐 ⚠️")
                 await self.client.send_message(message.channel.id, msg)
 
-        await self.on_message(message)
-
     async def on_message(self, message):
         pass
 
@@ -1,5 +1,7 @@
 import logging
-from qbot.plugin import Plugin
+
+from qbot import config
+from qbot.plugins import PLUGINS, import_plugins
 
 LOG = logging.getLogger("discord")
 
@@ -15,5 +17,9 @@ class PluginManager:
         LOG.info("Plugin %s loaded.", plugin.__name__)
 
     def load_all(self):
-        for plugin in Plugin.plugins:
+        """Import and load the plugins enabled by config.PLUGINS, all of
+        them by default
+        """
+        for plugin in import_plugins(getattr(config, "PLUGINS", PLUGINS)):
             self.load(plugin)
+        self.client.dispatcher.build(self.client.plugins)
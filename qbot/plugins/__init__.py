@@ -0,0 +1,24 @@
+import importlib
+
+# Config name of each plugin and where to find its class
+PLUGINS = {
+    "help": ("qbot.plugins.help", "Help"),
+    "moderator": ("qbot.plugins.moderator", "Moderator"),
+    "quote": ("qbot.plugins.quote", "Quote"),
+    "search": ("qbot.plugins.search", "Search"),
+    "streamers": ("qbot.plugins.streamers", "Streamers"),
+    "youtubers": ("qbot.plugins.youtubers", "Youtubers"),
+}
+
+def import_plugins(names):
+    """Import only the plugins named in names and return their classes"""
+    classes = []
+    for name in names:
+        try:
+            module_name, class_name = PLUGINS[name]
+        except KeyError:
+            raise ValueError("Unknown plugin '{}', choose from {}".format(
+                name, ", ".join(sorted(PLUGINS))))
+        module = importlib.import_module(module_name)
+        classes.append(getattr(module, class_name))
+    return classes
@@ -1,68 +1,90 @@
 import logging
 
-from discord.embeds import Embed
-
 from qbot.const import PREFIX
 from qbot.decorators import command
 from qbot.plugin import Plugin
 
 LOG = logging.getLogger("discord")
 
-async def get_help_info(self):
-    if self.fancy_name is None:
-        self.fancy_name = type(self).__name__
+EMBED_COLOUR = 3447003
+# Discord's limits for a single embed
+MAX_FIELDS = 25
+MAX_CHARS = 6000
+MAX_FIELD_VALUE = 1024
+
+def _field(name, value, inline):
+    return {"name": name, "value": value[:MAX_FIELD_VALUE], "inline": inline}
 
-    commands = []
-    for cmd in self.commands.values():
-        commands.append(cmd.info)
-    payload = {
-        "name": type(self).__name__,
-        "fancy_name": self.fancy_name,
-        "commands": commands
-    }
-    return payload
+def _field_size(field):
+    return len(field["name"]) + len(field["value"])
 
+def _embed(fields):
+    return {"type": "rich", "color": EMBED_COLOUR, "fields": fields}
 
 class Help(Plugin):
     def __init__(self, *args, **kwargs):
         Plugin.__init__(self, *args, **kwargs)
-        # Patch the Plugin class
-        Plugin.get_help_info = get_help_info
+        self._plugins = None
+        self._embeds = []
 
-    async def generate_help(self):
-        help_payload = []
-        for plugin in self.client.plugins:
-            help_info = await plugin.get_help_info()
-            help_payload.append(help_info)
+    async def on_ready(self):
+        self.get_embeds()
 
-        return self.render_message(help_payload)
+    def get_embeds(self):
+        """Return the help embeds as ready-to-send dicts, rendering them
+        again only when the loaded plugins changed
+        """
+        plugins = tuple(self.client.plugins)
+        if plugins != self._plugins:
+            self._embeds = self.render_message(
+                [plugin.get_help_info() for plugin in plugins])
+            self._plugins = plugins
+            LOG.info("Rendered help into %d embeds", len(self._embeds))
+        return self._embeds
 
-    def render_message(self, help_payload):
-        message_batches = []
+    @staticmethod
+    def render_message(help_payload):
+        """Pack the plugin sections into as few embeds as the embed limits
+        allow, starting a new embed rather than splitting a section unless
+        the section alone doesn't fit
+        """
+        embeds = []
+        fields = []
+        size = 0
         for plugin_info in help_payload:
-            if plugin_info["commands"] != []:
-                embed = Embed(colour=3447003)
-                embed.add_field(
-                    name="__**{} Plugin Commands**__".format(
-                        plugin_info["fancy_name"]),
-                    value="\u200b", inline=True)
-                for cmd in plugin_info["commands"]:
-                    embed.add_field(
-                        name="   **{}**".format(cmd["name"]),
-                        value=cmd.get("description", "--"), inline=False)
-                message_batches.append(embed)
-        return message_batches
+            if not plugin_info["commands"]:
+                continue
+            section = [_field("__**{} Plugin Commands**__".format(
+                plugin_info["fancy_name"]), "\u200b", True)]
+            for cmd in plugin_info["commands"]:
+                section.append(_field("   **{}**".format(cmd["name"]),
+                                      cmd.get("description") or "--", False))
+            section_size = sum(_field_size(field) for field in section)
+            if fields and (len(fields) + len(section) > MAX_FIELDS or
+                           size + section_size > MAX_CHARS):
+                embeds.append(_embed(fields))
+                fields = []
+                size = 0
+            for field in section:
+                if (len(fields) >= MAX_FIELDS or
+                        size + _field_size(field) > MAX_CHARS):
+                    embeds.append(_embed(fields))
+                    fields = []
+                    size = 0
+                fields.append(field)
+                size += _field_size(field)
+        if fields:
+            embeds.append(_embed(fields))
+        return embeds
 
     @command(pattern="^" + PREFIX + "help",
              description="Get help",
              usage=PREFIX + "help")
     async def help(self, message, __):
-        help_messages = await self.generate_help()
-        if help_messages == []:
-            help_messages = []
+        embeds = self.get_embeds()
+        if not embeds:
             await self.client.send_message(message.channel.id,
                                            "There's no command to show :cry:")
-        else:
-            for msg in help_messages:
-                await self.client.send_message(
-                    message.channel.id, content=None, embed=msg.to_dict())
+        for embed in embeds:
+            await self.client.send_message(message.channel.id, content=None,
+                                           embed=embed)
@@ -1,52 +1,125 @@
 # -*- coding: utf-8 -*-
 import asyncio
+from datetime import datetime, timedelta
 import logging
 import re
 
-import aiosqlite
-
 from qbot.const import PREFIX
 from qbot.decorators import command
+from qbot.metrics import summary as metrics_summary
 from qbot.plugin import Plugin
+from qbot.purge import PurgeFilter, Purger
 
 LOG = logging.getLogger("discord")
 NOT_FOUND = "I didn't find anything 😢..."
 
+CONFIRMATION_TTL = 10
+DURATION_RE = re.compile(r"^(\d+)([smhdw])$")
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days",
+                  "w": "weeks"}
+
+async def admins_only(member):  # pylint: disable=W0613
+    """user_check letting nobody but the guild's admins through"""
+    return False
+
+def parse_time(text):
+    """Parse a purge time bound, either a UTC date(time) such as 2021-03-01
+    or 2021-03-01T12:00, or a duration ago such as 30m, 12h or 7d
+    """
+    match = DURATION_RE.match(text)
+    if match:
+        return datetime.utcnow() - timedelta(
+            **{DURATION_UNITS[match.group(2)]: int(match.group(1))})
+    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError("Invalid time '{}'".format(text))
+
+def parse_purge_args(args):
+    """Return the number of messages to scan and the PurgeFilter of
+    [<@user>] [match:regex] [after:time] [before:time] number
+    """
+    *options, limit = args.split()
+    purge_filter = PurgeFilter()
+    for option in options:
+        key, __, value = option.partition(":")
+        if key == "match" and value:
+            purge_filter.pattern = re.compile(value)
+        elif key == "after" and value:
+            purge_filter.after = parse_time(value)
+        elif key == "before" and value:
+            purge_filter.before = parse_time(value)
+        elif re.match(r"^<@!?\d+>$", option):
+            purge_filter.author_id = int(re.search(r"\d+", option).group())
+        else:
+            raise ValueError("Invalid option '{}'".format(option))
+    try:
+        return int(limit), purge_filter
+    except ValueError:
+        raise ValueError("Invalid number of messages '{}'".format(limit))
+
 class Moderator(Plugin):
+    def __init__(self, client):
+        super().__init__(client)
+        self.purging = set()
+
+    def delete_later(self, channel_id, message_id, delay):
+        """Delete a message after delay seconds without waiting for it"""
+        async def delete():
+            try:
+                await self.client.http.delete_message(channel_id, message_id)
+            except Exception as exception:  # pylint: disable=W0703
+                LOG.exception(exception)
+        self.client.loop.call_later(delay, asyncio.ensure_future, delete())
+
     @command(pattern="^" + PREFIX + "purge (.*)",
              description="Clear past message by everyone or target user",
-             usage=PREFIX + "purge <@user> number")
+             usage=PREFIX + "purge [<@user>] [match:regex] [after:time] "
+                   "[before:time] number")
     async def purge(self, message, args):
-        async with aiosqlite.connect(self.db.path) as conn:
-            cursor = await conn.execute(
-                "SELECT mod_roles FROM guilds WHERE id=?", (message.guild.id,))
-            roles = await cursor.fetchone()
-            await cursor.close()
-        roles = map(int, roles[0].split(","))
-        if set(role.id for role in message.author.roles).isdisjoint(set(roles)):
+        settings = self.client.settings.get(message.guild.id)
+        roles = settings.mod_roles if settings else frozenset()
+        if roles.isdisjoint(role.id for role in message.author.roles):
             msg = "You don't have the permisson to do that!"
             await self.client.send_message(message.channel.id, msg)
             return
-        args = args[0].split(" ")
-        if len(args) == 1:
-            deleted = await message.channel.purge(limit=int(args[0]))
-        elif len(args) == 2:
-            try:
-                target_id = int(re.search(r"\d+", args[0]).group())
-                def check_id(msg):
-                    return msg.author.id == target_id
-                deleted = await message.channel.purge(limit=int(args[1]),
-                                                      check=check_id)
-            except Exception as exception:  # pylint: disable=W0703
-                LOG.exception(exception)
-                msg = "Invalid target user!"
-                await self.client.send_message(message.channel.id, msg)
-                return
-        msg = "Deleted {} message(s)".format(len(deleted))
-        confirm_msg = await self.client.send_message(message.channel.id, msg)
-        await asyncio.sleep(10)
-        await self.client.http.delete_message(message.channel.id,
-                                              confirm_msg["id"])
+        channel_id = message.channel.id
+        try:
+            limit, purge_filter = parse_purge_args(args[0])
+        except (ValueError, re.error) as exception:
+            await self.client.send_message(channel_id, str(exception))
+            return
+        if channel_id in self.purging:
+            msg = "A purge is already running in this channel!"
+            await self.client.send_message(channel_id, msg)
+            return
+
+        self.purging.add(channel_id)
+        try:
+            progress_msg = await self.client.send_message(
+                channel_id, "Purging...")
+
+            async def report(stats):
+                if not stats.done:
+                    await self.client.http.edit_message(
+                        channel_id, progress_msg["id"],
+                        content="Purging... {}".format(stats))
+
+            # Scan from the command itself, not the progress message
+            purger = Purger(self.client.http, channel_id, limit,
+                            purge_filter, before=message.id + 1,
+                            on_progress=report)
+            stats = await purger.run()
+        finally:
+            self.purging.discard(channel_id)
+        msg = "Deleted {} message(s)".format(stats.deleted)
+        if stats.failed:
+            msg += ", {} could not be deleted".format(stats.failed)
+        await self.client.http.edit_message(channel_id, progress_msg["id"],
+                                            content=msg)
+        self.delete_later(channel_id, progress_msg["id"], CONFIRMATION_TTL)
 
     @command(pattern="^" + PREFIX + "moderator_setup (.*)",
              description="Clear past message by everyone or target user",
@@ -56,13 +129,19 @@ class Moderator(Plugin):
         roles = [role.id for role in message.guild.roles if role.name in args]
         roles = ",".join(map(str, roles))
         try:
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(
-                    "UPDATE guilds SET mod_roles=? WHERE id=?",
-                    (roles, message.guild.id))
-                await conn.commit()
-                response = "Update Moderator roles!"
+            await self.client.settings.update(message.guild.id,
+                                              mod_roles=roles)
+            response = "Update Moderator roles!"
         except Exception as exception:  # pylint: disable=W0703
             LOG.exception(exception)
             response = "Couldn't update Moderator roles"
         await self.client.send_message(message.channel.id, response)
+
+    @command(pattern="^" + PREFIX + "metrics$",
+             description="Show where the bot spends its time (admins only)",
+             usage=PREFIX + "metrics", user_check=admins_only)
+    async def metrics(self, message, __):
+        # Keep under Discord's 2000 characters with the code block
+        await self.client.send_message(
+            message.channel.id, "```\n{}\n```".format(
+                metrics_summary()[:1900]))
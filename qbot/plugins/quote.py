@@ -1,16 +1,43 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime, timedelta
+from datetime import timedelta
+from difflib import SequenceMatcher
 import logging
 
-from discord.errors import NoMoreItems
-from symspellpy.symspellpy import SymSpell
-
 from qbot.const import PREFIX, TZ_OFFSET
 from qbot.decorators import command
+from qbot.messagecache import CachedMessage
 from qbot.plugin import Plugin
 from qbot.utility import try_parse_int64
 
 LOG = logging.getLogger("discord")
+QUOTE_HISTORY = 100
+QUOTE_MATCH_THRESHOLD = 0.8
+
+def best_match(input_term, contents, threshold):
+    """Return the index of the content closest to input_term once both are
+    spell-corrected against the words of input_term, or None if none is at
+    least threshold similar. Earlier contents win ties.
+    """
+    # Imported on first use, only text searches need it
+    from symspellpy.symspellpy import SymSpell
+    sym_spell = SymSpell()
+    for term in input_term.split(" "):
+        sym_spell.create_dictionary_entry(term, 1)
+    target = sym_spell.lookup_compound(input_term, 2)[0].term
+    best_index = None
+    best_score = threshold
+    for index, content in enumerate(contents):
+        if not content:
+            continue
+        term = sym_spell.lookup_compound(content, 2)[0].term
+        score = SequenceMatcher(None, term, target).ratio()
+        if score == 1.0:
+            return index
+        if score > best_score or (best_index is None and
+                                  score == best_score):
+            best_index = index
+            best_score = score
+    return best_index
 
 class Quote(Plugin):
     @command(pattern="^" + PREFIX + "quote (.*)",
@@ -19,37 +46,33 @@ class Quote(Plugin):
     async def quote(self, message, args):
         msg = None
         if try_parse_int64(args[0]) is not None:
-            msg_id = args[0]
-            try:
-                msg = await self.client.get_message(message.channel.id, msg_id)
-            except Exception as exception:  # pylint: disable=W0703
-                LOG.exception(exception)
-        else:
-            input_term = args[0]
-            sym_spell = SymSpell()
-            for term in input_term.split(" "):
-                sym_spell.create_dictionary_entry(term, 1)
-            target = sym_spell.lookup_compound(input_term, 2)[0].term
-            iterator = message.channel.history(limit=100)
-            for __ in range(100):
+            msg_id = int(args[0])
+            msg = self.client.message_cache.get(message.channel.id, msg_id)
+            if msg is None:
                 try:
-                    msg = await iterator.next()
-                    suggestion = sym_spell.lookup_compound(msg.content, 2)[0]
-                    if suggestion.term == target:
-                        msg = await self.client.get_message(
-                            message.channel.id, msg.id)
-                        break
-                except NoMoreItems:
-                    msg = None
+                    msg = CachedMessage.from_payload(
+                        await self.client.get_message(message.channel.id,
+                                                      msg_id))
+                except Exception as exception:  # pylint: disable=W0703
+                    LOG.exception(exception)
+        else:
+            history = await message.channel.history(
+                limit=QUOTE_HISTORY, before=message).flatten()
+            # Score the whole page in one pass on the executor so the
+            # lookups don't block the event loop
+            index = await self.client.loop.run_in_executor(
+                None, best_match, args[0],
+                [candidate.content for candidate in history],
+                QUOTE_MATCH_THRESHOLD)
+            if index is not None:
+                msg = CachedMessage.from_message(history[index])
         if msg is not None:
-            display_name = message.guild.get_member(
-                int(msg["author"]["id"])).display_name
-            time_str = (datetime.strptime(msg["timestamp"].split(".")[0],
-                                          "%Y-%m-%dT%H:%M:%S") +
-                        timedelta(hours=TZ_OFFSET)).strftime(
-                            "%Y-%m-%d %I:%M %p")
+            member = message.guild.get_member(msg.author_id)
+            display_name = member.display_name if member else msg.author_name
+            time_str = (msg.created_at + timedelta(hours=TZ_OFFSET)).strftime(
+                "%Y-%m-%d %I:%M %p")
             quote_msg = "```{} - {} UTC+{}\n{}```".format(
-                display_name, time_str, TZ_OFFSET, msg["content"])
+                display_name, time_str, TZ_OFFSET, msg.content)
         else:
             quote_msg = "Message not found!"
 
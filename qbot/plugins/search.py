@@ -1,147 +1,185 @@
 # -*- coding: utf-8 -*-
+import io
 import logging
-import os
 
-import aiohttp
 from discord.file import File
-from selenium import webdriver
-from selenium.webdriver.common.action_chains import ActionChains
 
-from qbot.config import DB_PATH, GOOGLE_API_KEY, TWITCH_CLIENT_ID
+from qbot import config
+from qbot.browser import BrowserBusy, BrowserPool
+from qbot.config import GOOGLE_API_KEY, TWITCH_CLIENT_ID
 from qbot.const import PREFIX
 from qbot.decorators import command
+from qbot.localindex import INDEX_PATH, LocalIndex
 from qbot.plugin import Plugin
+from qbot.searchcache import SearchCache
 
 LOG = logging.getLogger("discord")
 NOT_FOUND = "I didn't find anything 😢..."
+BROWSER_POOL_SIZE = getattr(config, "BROWSER_POOL_SIZE", 2)
+BROWSER_QUEUE_SIZE = getattr(config, "BROWSER_QUEUE_SIZE", 8)
+SEARCH_CACHE_SIZE = getattr(config, "SEARCH_CACHE_SIZE", 1000)
+SEARCH_CACHE_TTLS = getattr(config, "SEARCH_CACHE_TTLS", None)
+SEARCH_CACHE_PERSIST = getattr(config, "SEARCH_CACHE_PERSIST", False)
+# "remote", "local" or "local_first" for ~wiki and ~urbandict
+SEARCH_BACKEND = getattr(config, "SEARCH_BACKEND", "remote")
+LOCAL_INDEX_PATH = getattr(config, "LOCAL_INDEX_PATH", INDEX_PATH)
 
 class Search(Plugin):
+    def __init__(self, client):
+        super().__init__(client)
+        self.browsers = BrowserPool(BROWSER_POOL_SIZE, BROWSER_QUEUE_SIZE)
+        self.cache = SearchCache(self.db if SEARCH_CACHE_PERSIST else None,
+                                 SEARCH_CACHE_SIZE, SEARCH_CACHE_TTLS)
+        self.local_index = LocalIndex(LOCAL_INDEX_PATH)
+
+    async def on_ready(self):
+        await self.cache.purge_expired()
+
+    async def close(self):
+        self.browsers.close()
+        await self.local_index.close()
+
+    async def search_local(self, lookup, search):
+        """Return the local index result of lookup, or None if the remote
+        API should be asked instead
+        """
+        if SEARCH_BACKEND == "remote":
+            return None
+        try:
+            result = await lookup(search)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+            result = None
+        if result is None and SEARCH_BACKEND == "local":
+            return NOT_FOUND
+        return result
+
     @command(pattern="^" + PREFIX + "googleimg (.*)",
              description="Search for images using Google image",
              usage=PREFIX + "googleimg phrase")
     async def googleimg(self, message, args):
         search = args[0]
-        img_path = os.path.join(os.path.dirname(DB_PATH), "googleimg.png")
-        response = search
+        url = "https://www.google.com/search?tbm=isch&q={}".format(
+            search.replace(" ", "+"))
 
         try:
-            chrome_options = webdriver.ChromeOptions()
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--hide-scrollbars")
-            chrome_options.add_argument("--log-level=3")
-            driver = webdriver.Chrome(options=chrome_options)
-            url = "https://www.google.com/search?tbm=isch&q={}".format(
-                search.replace(" ", "+"))
-            driver.get(url)
             # Scroll to the top edge of image results
-            element = driver.find_element_by_id("center_col")
-            actions = ActionChains(driver)
-            actions.move_to_element(element).perform()
-            driver.save_screenshot(img_path)
-            driver.quit()
-            await self.client.send_files(
-                [File(img_path, filename=os.path.basename(img_path))],
+            png = await self.browsers.screenshot(url, element_id="center_col")
+        except BrowserBusy:
+            await self.client.send_message(
                 message.channel.id,
-                content="Google Images results for **{}**".format(search))
+                "Too many image searches at once, try again in a bit!")
+            return
         except Exception as exception:  # pylint: disable=W0703
             LOG.info("Cannot google image search with '%s'", search)
             LOG.exception(exception)
-            response = NOT_FOUND
-            await self.client.send_message(message.channel.id, response)
+            await self.client.send_message(message.channel.id, NOT_FOUND)
+            return
+        await self.client.send_files(
+            [File(io.BytesIO(png), filename="googleimg.png")],
+            message.channel.id,
+            content="Google Images results for **{}**".format(search))
 
     @command(pattern="^" + PREFIX + "twitch (.*)",
              description="Search for Twitch streamers",
              usage=PREFIX + "twitch streamer_name")
     async def twitch(self, message, args):
-        search = args[0]
+        response = await self.cache.get_or_fetch(
+            "twitch", args[0], lambda: self.search_twitch(args[0]))
+        await self.client.send_message(message.channel.id, response)
+
+    async def search_twitch(self, search):
         url = "https://api.twitch.tv/helix/users"
-        async with aiohttp.ClientSession() as session:
-            headers = {"Client-ID": TWITCH_CLIENT_ID}
-            params = {"login": search}
-            async with session.get(url, headers=headers,
-                                   params=params) as resp:
-                data = await resp.json()
+        headers = {"Client-ID": TWITCH_CLIENT_ID}
+        params = {"login": search}
+        data = await self.client.web.get_json(url, headers=headers,
+                                              params=params)
         if data["data"]:
             channel = data["data"][0]
             response = ("\n**" + channel["display_name"] +
                         "**: https://twitch.tv/{}".format(channel["login"]))
         else:
             response = NOT_FOUND
-
-        await self.client.send_message(message.channel.id, response)
+        return response
 
     @command(pattern="^" + PREFIX + "urbandict (.*)",
              description="Search for Urban Dictionary phrases",
              usage=PREFIX + "urbandict phrase")
     async def urbandict(self, message, args):
-        search = args[0]
-        url = "https://api.urbandictionary.com/v0/define"
-        async with aiohttp.ClientSession() as session:
-            params = {"term": search}
-            async with session.get(url, params=params) as resp:
-                data = await resp.json()
-        if data["list"]:
-            response = ("{}\n**Word:** {}\n**Definition:** {}\n"
-                        "**Example:** {}".format(
-                            data["list"][0]["permalink"],
-                            data["list"][0]["word"],
-                            data["list"][0]["definition"],
-                            data["list"][0]["example"]))
-            response = response.replace("[", "").replace("]", "")
-        else:
-            response = NOT_FOUND
-
+        response = await self.cache.get_or_fetch(
+            "urbandict", args[0], lambda: self.search_urbandict(args[0]))
         await self.client.send_message(message.channel.id, response)
 
+    async def search_urbandict(self, search):
+        entry = await self.search_local(self.local_index.urbandict, search)
+        if entry is NOT_FOUND:
+            return NOT_FOUND
+        if entry is None:
+            url = "https://api.urbandictionary.com/v0/define"
+            params = {"term": search}
+            data = await self.client.web.get_json(url, params=params)
+            if not data["list"]:
+                return NOT_FOUND
+            entry = data["list"][0]
+        response = ("{}\n**Word:** {}\n**Definition:** {}\n"
+                    "**Example:** {}".format(entry["permalink"],
+                                             entry["word"],
+                                             entry["definition"],
+                                             entry["example"]))
+        return response.replace("[", "").replace("]", "")
+
     @command(pattern="^" + PREFIX + "youtube (.*)",
              description="Search for YouTube videos",
              usage=PREFIX + "youtube video_name")
     async def youtube(self, message, args):
-        search = args[0]
+        response = await self.cache.get_or_fetch(
+            "youtube", args[0], lambda: self.search_youtube(args[0]))
+        await self.client.send_message(message.channel.id, response)
+
+    async def search_youtube(self, search):
         url = "https://www.googleapis.com/youtube/v3/search"
-        async with aiohttp.ClientSession() as session:
-            params = {"type": "video", "q": search, "part": "snippet",
-                      "key": GOOGLE_API_KEY}
-            async with session.get(url, params=params) as resp:
-                data = await resp.json()
+        params = {"type": "video", "q": search, "part": "snippet",
+                  "key": GOOGLE_API_KEY}
+        data = await self.client.web.get_json(url, params=params)
         if data["items"]:
             video = data["items"][0]
             response = "https://youtu.be/" + video["id"]["videoId"]
         else:
             response = NOT_FOUND
-
-        await self.client.send_message(message.channel.id, response)
+        return response
 
     @command(pattern="^" + PREFIX + "wiki (.*)",
              description="Search for Wikipedia pages",
              usage=PREFIX + "wiki <search terms>")
     async def wiki(self, message, args):
-        search = args[0]
+        response = await self.cache.get_or_fetch(
+            "wiki", args[0], lambda: self.search_wiki(args[0]))
+        await self.client.send_message(message.channel.id, response)
+
+    async def search_wiki(self, search):
+        response = await self.search_local(self.local_index.wiki, search)
+        if response is not None:
+            return response
         url = "https://en.wikipedia.org/w/api.php"
-        async with aiohttp.ClientSession() as session:
+        params = {
+            "action": "query",
+            "format": "json",
+            "list": "search",
+            "srlimit": "1",
+            "srsearch": search
+        }
+        data = await self.client.web.get_json(url, params=params)
+        if data["query"]["searchinfo"]["totalhits"] > 0:
+            page_id = str(data["query"]["search"][0]["pageid"])
             params = {
                 "action": "query",
                 "format": "json",
-                "list": "search",
-                "srlimit": "1",
-                "srsearch": search
+                "prop": "info",
+                "pageids": page_id,
+                "inprop": "url"
             }
-            async with session.get(url, params=params) as resp:
-                data = await resp.json()
-        if data["query"]["searchinfo"]["totalhits"] > 0:
-            page_id = str(data["query"]["search"][0]["pageid"])
-            async with aiohttp.ClientSession() as session:
-                params = {
-                    "action": "query",
-                    "format": "json",
-                    "prop": "info",
-                    "pageids": page_id,
-                    "inprop": "url"
-                }
-                async with session.get(url, params=params) as resp:
-                    data = await resp.json()
+            data = await self.client.web.get_json(url, params=params)
             response = data["query"]["pages"][page_id]["fullurl"]
         else:
             response = NOT_FOUND
-
-        await self.client.send_message(message.channel.id, response)
+        return response
@@ -3,15 +3,19 @@ from collections import defaultdict
 import asyncio
 import logging
 import re
+import time
+from urllib.parse import urlparse
 
-import aiohttp
-import aiosqlite
-
+from qbot import config
 from qbot.config import TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET
 from qbot.const import PREFIX
 from qbot.decorators import bg_task, command
+from qbot.eventsub import EventSubReceiver
 from qbot.plugin import Plugin
-from qbot.utility import replace_multiple
+from qbot.state import StateTracker
+from qbot.subscriptions import (SubscriptionIndex, add_subscription,
+                                get_channel_id, remove_subscription)
+from qbot.template import STREAMER_PLACEHOLDERS, validate_template
 
 LOG = logging.getLogger("discord")
 NOT_FOUND = "I didn't find anything 😢..."
@@ -33,8 +37,7 @@ class Streamer:  # pylint: disable=R0903
 # Twitch
 TWITCH_PLATFORM = Platform("twitch")
 
-TWITCH_GET_STREAM = ("https://api.twitch.tv/helix/streams?user_id=$USER_ID$&"
-                     "first=100")
+TWITCH_GET_STREAM = "https://api.twitch.tv/helix/streams"
 TWITCH_GET_USER = "https://api.twitch.tv/helix/users"
 TWITCH_AUTHORIZE = ("https://id.twitch.tv/oauth2/token"
                     f"?client_id={TWITCH_CLIENT_ID}"
@@ -42,36 +45,128 @@ TWITCH_AUTHORIZE = ("https://id.twitch.tv/oauth2/token"
                     "&grant_type=client_credentials")
 TWITCH_VALIDATE = "https://id.twitch.tv/oauth2/validate"
 TWITCH_ACCESS_TOKEN = ""
+# Only one request refreshes the token when concurrent ones get a 401
+TWITCH_TOKEN_LOCK = asyncio.Lock()
+TWITCH_PAGE_SIZE = 100
+TWITCH_CONCURRENCY = 4
+TWITCH_EVENTSUB = "https://api.twitch.tv/helix/eventsub/subscriptions"
+EVENTSUB_TYPES = ("stream.online", "stream.offline")
+# Subscriptions in these states still deliver, or will once verified
+EVENTSUB_ACTIVE = ("enabled", "webhook_callback_verification_pending")
+# Push mode: public URL Twitch sends EventSub notifications to, served
+# by the bot's webhook server under the same path
+TWITCH_EVENTSUB_CALLBACK = getattr(config, "TWITCH_EVENTSUB_CALLBACK", None)
+TWITCH_EVENTSUB_SECRET = getattr(config, "TWITCH_EVENTSUB_SECRET", None)
+# With push enabled polling only catches up on missed notifications
+TWITCH_RECONCILE_INTERVAL = getattr(config, "TWITCH_RECONCILE_INTERVAL",
+                                    5 * 60)
+TWITCH_PUSH = bool(TWITCH_EVENTSUB_CALLBACK and TWITCH_EVENTSUB_SECRET)
+STREAMER_CHECK_INTERVAL = TWITCH_RECONCILE_INTERVAL if TWITCH_PUSH else 30
 
 def set_twitch_access_token(token):
     global TWITCH_ACCESS_TOKEN
     TWITCH_ACCESS_TOKEN = token
     LOG.info("Updated twitch access token")
 
+async def refresh_twitch_access_token(web, stale_token):
+    """Fetch a new app access token unless another request already replaced
+    stale_token in the meantime
+    """
+    async with TWITCH_TOKEN_LOCK:
+        if TWITCH_ACCESS_TOKEN != stale_token:
+            return
+        async with web.post(TWITCH_AUTHORIZE) as auth_resp:
+            auth_result = await auth_resp.json()
+        set_twitch_access_token(auth_result["access_token"])
+
+async def twitch_request(web, method, url, params=None, json=None):
+    """Call a Helix endpoint, refreshing the access token and retrying the
+    same request once if it was rejected
+    """
+    for attempt in range(2):
+        token = TWITCH_ACCESS_TOKEN
+        headers = {"Authorization": f"Bearer {token}",
+                   "Client-ID": TWITCH_CLIENT_ID}
+        async with web.request(method, url, headers=headers, params=params,
+                               json=json) as resp:
+            if resp.status != 401 or attempt:
+                if resp.status == 204:
+                    return {}
+                return await resp.json()
+        await refresh_twitch_access_token(web, token)
+
+async def twitch_get(web, url, params):
+    return await twitch_request(web, "GET", url, params=params)
+
+async def list_eventsub(web):
+    """Return every EventSub subscription of the app"""
+    subscriptions = []
+    params = {}
+    while True:
+        result = await twitch_get(web, TWITCH_EVENTSUB, params)
+        subscriptions += result["data"]
+        cursor = result.get("pagination", {}).get("cursor")
+        if not cursor:
+            return subscriptions
+        params = {"after": cursor}
+
+async def create_eventsub(web, subscription_type, user_id):
+    """Subscribe to subscription_type events of user_id, return the id of
+    the subscription
+    """
+    result = await twitch_request(web, "POST", TWITCH_EVENTSUB, json={
+        "type": subscription_type,
+        "version": "1",
+        "condition": {"broadcaster_user_id": user_id},
+        "transport": {"method": "webhook",
+                      "callback": TWITCH_EVENTSUB_CALLBACK,
+                      "secret": TWITCH_EVENTSUB_SECRET},
+    })
+    if not result.get("data"):
+        raise RuntimeError("Cannot subscribe to {} of {}: {}".format(
+            subscription_type, user_id, result.get("message")))
+    return result["data"][0]["id"]
+
+async def delete_eventsub(web, subscription_id):
+    await twitch_request(web, "DELETE", TWITCH_EVENTSUB,
+                         params={"id": subscription_id})
+
+async def get_twitch_logins(web, user_ids):
+    """Return a user_id -> login map, looking up to 100 users per request"""
+    logins = {}
+    for i in range(0, len(user_ids), TWITCH_PAGE_SIZE):
+        params = [("id", user_id)
+                  for user_id in user_ids[i : i + TWITCH_PAGE_SIZE]]
+        result = await twitch_get(web, TWITCH_GET_USER, params)
+        for user in result["data"]:
+            logins[user["id"]] = user["login"]
+    return logins
+
 @TWITCH_PLATFORM.set_collector
-async def twitch_collector(streamers):
+async def twitch_collector(web, streamers):
     streamers = list(map(lambda s: s.replace(" ", "_"), streamers))
+    semaphore = asyncio.Semaphore(TWITCH_CONCURRENCY)
+
+    async def get_page(page):
+        params = [("user_id", user_id) for user_id in page]
+        params.append(("first", str(TWITCH_PAGE_SIZE)))
+        async with semaphore:
+            return (await twitch_get(web, TWITCH_GET_STREAM, params))["data"]
+
+    pages = await asyncio.gather(*[
+        get_page(streamers[i : i + TWITCH_PAGE_SIZE])
+        for i in range(0, len(streamers), TWITCH_PAGE_SIZE)])
+    streams = [stream for page in pages for stream in page]
+
+    # Streams normally carry the login already, only look up the rest
+    missing = [stream["user_id"] for stream in streams
+               if not stream.get("user_login")]
+    logins = await get_twitch_logins(web, missing) if missing else {}
     live_streamers = []
-    for i in range(0, len(streamers), 100):
-        user_id = "&user_id=".join(streamers[i : i + 100])
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {TWITCH_ACCESS_TOKEN}",
-                       "Client-ID": TWITCH_CLIENT_ID}
-            async with session.get(TWITCH_GET_STREAM.replace(
-                "$USER_ID$", user_id), headers=headers) as stream_resp:
-                stream_result = await stream_resp.json()
-                if stream_result.get("status") == 401:
-                    async with session.post(TWITCH_AUTHORIZE) as auth_resp:
-                        auth_result = await auth_resp.json()
-                        set_twitch_access_token(auth_result["access_token"])
-                for stream in stream_result["data"]:
-                    params = {"id": stream["user_id"]}
-                    async with session.get(TWITCH_GET_USER, headers=headers,
-                                           params=params) as user_resp:
-                        user_result = (await user_resp.json())["data"][0]
-                        streamer = Streamer(user_result["login"],
-                                            stream["user_id"])
-                        live_streamers.append(streamer)
+    for stream in streams:
+        login = stream.get("user_login") or logins.get(stream["user_id"])
+        if login:
+            live_streamers.append(Streamer(login, stream["user_id"]))
     return live_streamers
 
 class Streamers(Plugin):
@@ -83,70 +178,180 @@ class Streamers(Plugin):
     def __init__(self, client):
         super().__init__(client)
         self._ready = asyncio.Event(loop=self.client.loop)
+        self.subscriptions = {platform.name: SubscriptionIndex(platform.name)
+                              for platform in self.platforms}
+        self.states = {platform.name: StateTracker(platform.name)
+                       for platform in self.platforms}
+        # Polls and push notifications must not both announce a streamer
+        self._state_lock = asyncio.Lock()
+        # user_id -> when a push notification last set its online state,
+        # a poll which started before that is out of date for the streamer
+        self.pushed = {}
+        # user_id -> {subscription type: EventSub subscription id}
+        self.eventsub = defaultdict(dict)
+        self.client.link.on("streamers.announce", self.on_remote_announce)
+        self.client.link.on("streamers.subscription", self.on_subscription)
+        self.client.link.on("streamers.eventsub", self.on_remote_eventsub)
+        if TWITCH_PUSH:
+            receiver = EventSubReceiver(TWITCH_EVENTSUB_SECRET,
+                                        self.on_eventsub,
+                                        self.on_eventsub_revocation)
+            self.client.webhooks.add_route(
+                "POST", urlparse(TWITCH_EVENTSUB_CALLBACK).path or "/",
+                receiver.handle)
 
     async def wait_until_ready(self):
         await self._ready.wait()
 
     async def on_ready(self):
-        guilds = await self.get_guild_list()
-        for guild in guilds:
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(
-                    f"CREATE TABLE IF NOT EXISTS streamers_{guild.id} ("
-                    "name TEXT NOT NULL,"
-                    "user_id TEXT PRIMARY KEY,"
-                    "online INTEGER NOT NULL);")
-                await conn.commit()
+        for index in self.subscriptions.values():
+            await index.load(self.db)
+        for state in self.states.values():
+            await state.load(self.db, self.client.link.owns_channel)
         self._ready.set()
+        if TWITCH_PUSH and self.client.link.primary:
+            await self.sync_eventsub()
 
     async def get_guild_list(self):
         return self.client.guilds
 
-    async def get_live_streamers_by_guilds(self):
-        guilds = await self.get_guild_list()
-        data = defaultdict(list)
-        for platform in self.platforms:
-            streamers = []
-            temp_data = {}
-            for guild in guilds:
-                async with aiosqlite.connect(self.db.path) as conn:
-                    cursor = await conn.execute(
-                        f"SELECT user_id FROM streamers_{guild.id}")
-                    guild_streamers = await cursor.fetchall()
-                    await cursor.close()
-                # cursor fetch all returns the entries as tuples
-                guild_streamers = [s[0] for s in guild_streamers]
-                temp_data[guild] = guild_streamers
-                streamers += guild_streamers
-            streamers = set(streamers)
-            if not streamers:
+    async def sync_eventsub(self):
+        """Make our EventSub subscriptions match the tracked streamers"""
+        wanted = set(self.subscriptions[TWITCH_PLATFORM.name].channel_ids())
+        try:
+            existing = await list_eventsub(self.client.web)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.info("Cannot list EventSub subscriptions")
+            LOG.exception(exception)
+            return
+        self.eventsub.clear()
+        for subscription in existing:
+            if (subscription["transport"].get("callback") !=
+                    TWITCH_EVENTSUB_CALLBACK):
                 continue
+            user_id = subscription["condition"].get("broadcaster_user_id")
+            if (user_id in wanted and subscription["type"] in EVENTSUB_TYPES
+                    and subscription["status"] in EVENTSUB_ACTIVE):
+                self.eventsub[user_id][subscription["type"]] = (
+                    subscription["id"])
+            else:
+                await self.unsubscribe_eventsub_ids([subscription["id"]])
+        await self.subscribe_eventsub(wanted)
 
-            streamers = set(map(lambda s: re.sub("[^0-9a-zA-Z_]+", "", s),
-                                streamers))
-            try:
-                live_streamers = await platform.collector(streamers)
-                for guild, guild_streamers in temp_data.items():
-                    for streamer in live_streamers:
-                        if streamer.user_id in guild_streamers:
-                            data[guild.id].append(streamer)
-                streamer_ids = [streamer.user_id
-                                for streamer in live_streamers]
-                for guild in guilds:
-                    for streamer in streamers:
-                        if streamer in streamer_ids:
-                            continue
-                        # set offline streamer
-                        async with aiosqlite.connect(self.db.path) as conn:
-                            await conn.execute(
-                                f"UPDATE streamers_{guild.id} SET online=0 "
-                                "WHERE user_id=?", (streamer,))
-                            await conn.commit()
+    async def subscribe_eventsub(self, user_ids):
+        """Create the EventSub subscriptions missing for user_ids"""
+        semaphore = asyncio.Semaphore(TWITCH_CONCURRENCY)
 
+        async def subscribe(user_id, subscription_type):
+            async with semaphore:
+                try:
+                    self.eventsub[user_id][subscription_type] = (
+                        await create_eventsub(self.client.web,
+                                              subscription_type, user_id))
+                except Exception as exception:  # pylint: disable=W0703
+                    LOG.exception(exception)
+
+        await asyncio.gather(*[
+            subscribe(user_id, subscription_type) for user_id in user_ids
+            for subscription_type in EVENTSUB_TYPES
+            if subscription_type not in self.eventsub[user_id]])
+
+    async def unsubscribe_eventsub(self, user_id):
+        subscription_ids = self.eventsub.pop(user_id, {}).values()
+        await self.unsubscribe_eventsub_ids(subscription_ids)
+
+    async def unsubscribe_eventsub_ids(self, subscription_ids):
+        for subscription_id in subscription_ids:
+            try:
+                await delete_eventsub(self.client.web, subscription_id)
             except Exception as exception:  # pylint: disable=W0703
-                LOG.info("Cannot gather live streamers from %s", platform.name)
-                LOG.info("With streamers: %s", ",".join(streamers))
                 LOG.exception(exception)
+
+    async def on_eventsub(self, subscription_type, event):
+        user_id = event["broadcaster_user_id"]
+        if not self.client.link.owns_channel(user_id):
+            # The process polling the streamer knows whether it is live
+            self.client.link.send_to_channel(
+                user_id, "streamers.eventsub",
+                {"type": subscription_type, "event": event})
+            return
+        platform = TWITCH_PLATFORM
+        if not self.subscriptions[platform.name].get_guilds(user_id):
+            return
+        async with self._state_lock:
+            self.pushed[user_id] = time.monotonic()
+            state = self.states[platform.name]
+            if subscription_type == "stream.online":
+                if user_id not in state.online:
+                    streamer = Streamer(event["broadcaster_user_login"],
+                                        user_id)
+                    await self.announce(platform, [streamer], set())
+            elif subscription_type == "stream.offline":
+                if user_id in state.online:
+                    await state.commit_online(self.db, set(), {user_id})
+
+    async def on_remote_eventsub(self, data):
+        await self.on_eventsub(data["type"], data["event"])
+
+    async def on_eventsub_revocation(self, subscription):
+        user_id = subscription["condition"].get("broadcaster_user_id")
+        self.eventsub.get(user_id, {}).pop(subscription["type"], None)
+
+    async def get_live_streamers(self, platform):
+        """Return the live streamers of platform by user id, None if they
+        cannot be collected
+        """
+        streamers = [user_id for user_id
+                     in self.subscriptions[platform.name].channel_ids()
+                     if self.client.link.owns_channel(user_id)]
+        if not streamers:
+            return {}
+
+        streamers = set(map(lambda s: re.sub("[^0-9a-zA-Z_]+", "", s),
+                            streamers))
+        try:
+            live_streamers = await platform.collector(self.client.web,
+                                                     streamers)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.info("Cannot gather live streamers from %s", platform.name)
+            LOG.info("With streamers: %s", ",".join(streamers))
+            LOG.exception(exception)
+            return None
+        return {streamer.user_id: streamer for streamer in live_streamers}
+
+    async def subscription_changed(self, guild_id, user_id, added):
+        """Apply a subscription change written to the DB here and in every
+        other process
+        """
+        self.client.link.broadcast("streamers.subscription", {
+            "guild_id": guild_id, "user_id": user_id, "added": added})
+        await self.update_subscription(guild_id, user_id, added)
+
+    async def on_subscription(self, data):
+        await self.update_subscription(data["guild_id"], data["user_id"],
+                                       data["added"])
+
+    async def update_subscription(self, guild_id, user_id, added):
+        subscriptions = self.subscriptions[TWITCH_PLATFORM.name]
+        push = TWITCH_PUSH and self.client.link.primary
+        if added:
+            subscriptions.add(guild_id, user_id)
+            if push:
+                await self.subscribe_eventsub([user_id])
+        else:
+            subscriptions.remove(guild_id, user_id)
+            if not subscriptions.get_guilds(user_id):
+                self.states[TWITCH_PLATFORM.name].forget(user_id)
+                if push:
+                    await self.unsubscribe_eventsub(user_id)
+
+    def group_by_guilds(self, platform, streamers):
+        """Return streamers grouped by the guilds following them"""
+        data = defaultdict(list)
+        subscriptions = self.subscriptions[platform.name]
+        for streamer in streamers:
+            for guild_id in subscriptions.get_guilds(streamer.user_id):
+                data[guild_id].append(streamer)
         return data
 
     @command(pattern="^" + PREFIX + "streamer (.*)",
@@ -162,32 +367,27 @@ class Streamers(Plugin):
         streamer_name = cmd[1]
         guild_id = message.guild.id
         if operation == "add":
-            async with aiohttp.ClientSession() as session:
-                headers = {"Authorization": f"Bearer {TWITCH_ACCESS_TOKEN}",
-                           "Client-ID": TWITCH_CLIENT_ID}
-                params = {"login": streamer_name}
-                # Check if channel exist
-                async with session.get(TWITCH_GET_USER, headers=headers,
-                                       params=params) as resp:
-                    data = await resp.json()
-                if not data["data"]:
-                    response = NOT_FOUND
-                else:
-                    # write entry using channel name instead of display name
-                    async with aiosqlite.connect(self.db.path) as conn:
-                        await conn.execute(
-                            f"INSERT OR IGNORE INTO streamers_{guild_id} "
-                            "(name,user_id,online) VALUES(?,?,?)",
-                            (data["data"][0]["login"],
-                             data["data"][0]["id"], 0))
-                        await conn.commit()
-                        response = f"Added streamer {streamer_name}!"
+            params = {"login": streamer_name}
+            # Check if channel exist
+            data = await twitch_get(self.client.web, TWITCH_GET_USER, params)
+            if not data["data"]:
+                response = NOT_FOUND
+            else:
+                # write entry using channel name instead of display name
+                await add_subscription(
+                    self.db, TWITCH_PLATFORM.name, guild_id,
+                    data["data"][0]["id"], name=data["data"][0]["login"])
+                await self.subscription_changed(guild_id,
+                                                data["data"][0]["id"], True)
+                response = f"Added streamer {streamer_name}!"
         elif operation == "rm":
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(f"DELETE FROM streamers_{guild_id} "
-                                   "WHERE name=?", (streamer_name,))
-                await conn.commit()
-                response = f"Removed streamer {streamer_name}!"
+            user_id = await get_channel_id(self.db, TWITCH_PLATFORM.name,
+                                           streamer_name)
+            if user_id is not None:
+                await remove_subscription(self.db, TWITCH_PLATFORM.name,
+                                          guild_id, user_id)
+                await self.subscription_changed(guild_id, user_id, False)
+            response = f"Removed streamer {streamer_name}!"
         else:
             response = "Unknown command, use 'add' or 'rm'."
 
@@ -205,56 +405,104 @@ class Streamers(Plugin):
         streamers_channel = int(args[0][2:-1])
         streamers_text = args[1]
         try:
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(
-                    "UPDATE guilds SET streamers_channel=?, "
-                    "streamers_text=? WHERE id=?",
-                    (streamers_channel, streamers_text, message.guild.id))
-                await conn.commit()
-                response = "Update Streamers annoucement text and channel!"
+            validate_template(streamers_text, STREAMER_PLACEHOLDERS)
+        except ValueError as exception:
+            await self.client.send_message(message.channel.id,
+                                           str(exception))
+            return
+        try:
+            await self.client.settings.update(
+                message.guild.id, streamers_channel=streamers_channel,
+                streamers_text=streamers_text)
+            response = "Update Streamers annoucement text and channel!"
         except Exception as exception:  # pylint: disable=W0703
             LOG.exception(exception)
             response = ("Couldn't update Streamers annoucement text and "
                         "channel")
         await self.client.send_message(message.channel.id, response)
 
-    @bg_task(30)
+    def render_announcements(self, guild_id, streamers):
+        """Return the (channel_id, content) announcing streamers in
+        guild_id, none if the guild isn't set up on this shard
+        """
+        guild = self.client.get_guild(guild_id)
+        if not guild:
+            return []
+        settings = self.client.settings.get(guild.id)
+        if not settings:
+            return []
+        contents = settings.streamers_template.render_many(
+            {"streamer": streamer.user_name, "link": streamer.link}
+            for streamer in streamers)
+        return [(settings.streamers_channel, content)
+                for content in contents]
+
+    async def on_remote_announce(self, data):
+        """Announce streamers for the process polling them, return the ids
+        of the ones delivered
+        """
+        streamers = [Streamer(user_name, user_id)
+                     for user_name, user_id in data["streamers"]]
+        announcements = self.render_announcements(data["guild_id"],
+                                                  streamers)
+        if not announcements:
+            return []
+        delivered = await self.client.announcer.announce_many(announcements)
+        return [streamer.user_id for streamer, ok
+                in zip(streamers, delivered) if ok]
+
+    async def announce(self, platform, went_live, went_offline):
+        """Announce the streamers which went live in the guilds following
+        them and record the new online states. Guilds on the shards of
+        other processes are announced by them. Call with _state_lock held.
+        """
+        announced = []
+        announcements = []
+        remote = []
+        for guild_id, live_streamers in self.group_by_guilds(
+                platform, went_live).items():
+            if not self.client.link.owns_guild(guild_id):
+                remote.append(self.client.link.request_guild(
+                    guild_id, "streamers.announce",
+                    {"guild_id": guild_id,
+                     "streamers": [[streamer.user_name, streamer.user_id]
+                                   for streamer in live_streamers]}))
+                continue
+            rendered = self.render_announcements(guild_id, live_streamers)
+            if rendered:
+                announced += [streamer.user_id for streamer in live_streamers]
+                announcements += rendered
+        delivered, *acks = await asyncio.gather(
+            self.client.announcer.announce_many(announcements), *remote)
+        # only record a streamer as live once it was announced somewhere
+        went_live = set(user_id for user_id, ok
+                        in zip(announced, delivered) if ok)
+        for acked in acks:
+            went_live.update(acked or ())
+        await self.states[platform.name].commit_online(self.db, went_live,
+                                                       went_offline)
+
+    @bg_task(STREAMER_CHECK_INTERVAL)
     async def streamer_check(self):
-        data = await self.get_live_streamers_by_guilds()
-        for guild_id, live_streamers in data.items():
-            guild = self.client.get_guild(guild_id)
-            if not guild:
+        if TWITCH_PUSH and self.client.link.primary:
+            # Resubscribe where Twitch revoked or we failed to subscribe
+            await self.subscribe_eventsub(
+                self.subscriptions[TWITCH_PLATFORM.name].channel_ids())
+        for platform in self.platforms:
+            started = time.monotonic()
+            live_streamers = await self.get_live_streamers(platform)
+            if live_streamers is None:
                 continue
-            async with aiosqlite.connect(self.db.path) as conn:
-                cursor = await conn.execute(
-                    "SELECT streamers_channel, streamers_text FROM guilds "
-                    "WHERE id=?", (guild.id,))
-                streamers_channel, streamers_text = await cursor.fetchone()
-                await cursor.close()
-            async with aiosqlite.connect(self.db.path) as conn:
-                cursor = await conn.execute(
-                    f"SELECT user_id FROM streamers_{guild.id} "
-                    "WHERE online=1")
-                streamer_ids = await cursor.fetchall()
-                await cursor.close()
-            streamer_ids = [s[0] for s in streamer_ids]
-            for streamer in live_streamers:
-                checked = streamer.user_id in streamer_ids
-                if checked:
-                    continue
-                try:
-                    rep = {
-                        "{streamer}": streamer.user_name,
-                        "{link}": streamer.link
-                    }
-                    await self.client.send_message(
-                        streamers_channel,
-                        replace_multiple(rep, streamers_text)
-                    )
-                    async with aiosqlite.connect(self.db.path) as conn:
-                        await conn.execute(
-                            f"UPDATE streamers_{guild.id} SET online=1 "
-                            "WHERE user_id=?", (streamer.user_id,))
-                        await conn.commit()
-                except Exception as exception:  # pylint: disable=W0703
-                    LOG.exception(exception)
+            async with self._state_lock:
+                went_live, went_offline = self.states[
+                    platform.name].diff_online(live_streamers)
+                # Pushes received while polling are more recent
+                pushed = set(user_id for user_id, when
+                             in self.pushed.items() if when >= started)
+                went_live -= pushed
+                went_offline -= pushed
+                self.pushed = {user_id: self.pushed[user_id]
+                               for user_id in pushed}
+                await self.announce(
+                    platform, [live_streamers[user_id]
+                               for user_id in went_live], went_offline)
@@ -1,18 +1,24 @@
 from collections import defaultdict
 
 import asyncio
+from datetime import datetime, timedelta
 import logging
 import re
+import time
+from urllib.parse import urlparse
 
-import aiohttp
-import aiosqlite
 from lxml import etree as ET
 
+from qbot import config
 from qbot.config import GOOGLE_API_KEY
 from qbot.const import PREFIX
 from qbot.decorators import bg_task, command
 from qbot.plugin import Plugin
-from qbot.utility import replace_multiple
+from qbot.state import StateTracker
+from qbot.subscriptions import (SubscriptionIndex, add_subscription,
+                                remove_subscription)
+from qbot.template import YOUTUBER_PLACEHOLDERS, validate_template
+from qbot.websub import WebSubSubscriber
 
 LOG = logging.getLogger("discord")
 NOT_FOUND = "I didn't find anything 😢..."
@@ -21,58 +27,145 @@ class Platform:  # pylint: disable=R0903
     def __init__(self, name):
         self.name = name
         self.collector = None
+        self.stats = None
 
     def set_collector(self, collector_func):
         self.collector = collector_func
 
 class Video:  # pylint: disable=R0903
-    def __init__(self, channel_name, channel_id, video_id):
+    def __init__(self, channel_name, channel_id, video_id, published=None):
         self.channel_name = channel_name
         self.channel_id = channel_id
         self.video_id = video_id
+        self.published = published
+        # (ETag, Last-Modified) of the feed the video was read from
+        self.validators = None
+
+class FeedStats:  # pylint: disable=R0903
+    """Outcome of one collector cycle"""
+    def __init__(self):
+        self.fetched = 0
+        self.not_modified = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f"{self.fetched} fetched, {self.not_modified} not modified, "
+                f"{self.failed} failed in {self.elapsed:.1f}s")
 
 YOUTUBE_PLATFORM = Platform("youtube")
 
+YOUTUBE_FEED = "https://www.youtube.com/feeds/videos.xml"
+YOUTUBE_CONCURRENCY = getattr(config, "YOUTUBE_CONCURRENCY", 10)
+# channel_id -> (ETag, Last-Modified) of the last feed we fully handled
+FEED_VALIDATORS = {}
+YOUTUBE_TOPIC = "https://www.youtube.com/xml/feeds/videos.xml?channel_id="
+# Push mode: public URL the WebSub hub delivers feed updates to, served by
+# the bot's webhook server under the same path
+YOUTUBE_WEBSUB_CALLBACK = getattr(config, "YOUTUBE_WEBSUB_CALLBACK", None)
+YOUTUBE_WEBSUB_SECRET = getattr(config, "YOUTUBE_WEBSUB_SECRET", None)
+YOUTUBE_WEBSUB_HUB = getattr(config, "YOUTUBE_WEBSUB_HUB",
+                             "https://pubsubhubbub.appspot.com/subscribe")
+YOUTUBE_WEBSUB_LEASE = getattr(config, "YOUTUBE_WEBSUB_LEASE",
+                               5 * 24 * 60 * 60)
+# Renew leases ending within this many seconds
+YOUTUBE_WEBSUB_RENEW = getattr(config, "YOUTUBE_WEBSUB_RENEW", 24 * 60 * 60)
+# With push enabled polling only catches up on missed notifications
+YOUTUBE_RECONCILE_INTERVAL = getattr(config, "YOUTUBE_RECONCILE_INTERVAL",
+                                     6 * 60 * 60)
+YOUTUBE_PUSH = bool(YOUTUBE_WEBSUB_CALLBACK)
+YOUTUBER_CHECK_INTERVAL = (YOUTUBE_RECONCILE_INTERVAL if YOUTUBE_PUSH
+                           else 60 * 60)
+# The hub also pushes edits of old videos, those aren't news
+MAX_PUSHED_VIDEO_AGE = timedelta(days=1)
+
+def parse_published(text):
+    """Parse a feed or API timestamp, e.g. 2021-03-01T12:00:00+00:00, as a
+    naive UTC datetime
+    """
+    return datetime.strptime(text[:19], "%Y-%m-%dT%H:%M:%S")
+
+def parse_feed(text):
+    """Return the latest Video of an Atom feed, None if it has no entry"""
+    root = ET.fromstring(text.encode("utf-8"))
+    nsmap = {k if k is not None else "default": v
+             for k, v in root.nsmap.items()}
+    video_id = root.find("./default:entry/yt:videoId", namespaces=nsmap)
+    if video_id is None:
+        return None
+    published = root.find("./default:entry/default:published",
+                          namespaces=nsmap)
+    if published is not None:
+        published = parse_published(published.text)
+    return Video(
+        root.find(".//default:title", namespaces=nsmap).text,
+        root.find(".//yt:channelId", namespaces=nsmap).text,
+        video_id.text,
+        published
+    )
+
+async def fetch_feed(web, channel_id, stats):
+    headers = {}
+    etag, last_modified = FEED_VALIDATORS.get(channel_id, (None, None))
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    params = {
+        "channel_id": channel_id
+    }
+    async with web.get(YOUTUBE_FEED, params=params, headers=headers) as resp:
+        if resp.status == 304:
+            stats.not_modified += 1
+            return None
+        resp.raise_for_status()
+        result = await resp.text()
+        validators = (resp.headers.get("ETag"),
+                      resp.headers.get("Last-Modified"))
+    stats.fetched += 1
+    video = parse_feed(result)
+    if video is None:
+        FEED_VALIDATORS[channel_id] = validators
+    else:
+        # Saved by save_validators once the video is handled, until then
+        # the feed is downloaded again rather than answered with a 304
+        video.validators = validators
+    return video
+
+def save_validators(videos, new_videos, state):
+    """Keep the validators of the feeds whose video is either not new or
+    recorded as the latest by now
+    """
+    new_ids = set(video.video_id for video in new_videos)
+    for video in videos:
+        if video.validators is not None and (
+                video.video_id not in new_ids or
+                state.latest.get(video.channel_id) == video.video_id):
+            FEED_VALIDATORS[video.channel_id] = video.validators
+
 @YOUTUBE_PLATFORM.set_collector
-async def youtube_collector(youtubers):
+async def youtube_collector(web, youtubers):
     youtubers = list(map(lambda s: s.replace(" ", "_"), youtubers))
-    latest_videos = []
-    for channel_id in youtubers:
-        url = "https://www.youtube.com/feeds/videos.xml"
-        async with aiohttp.ClientSession() as session:
-            params = {
-                "channel_id": channel_id
-            }
-            async with session.get(url, params=params) as resp:
-                result = await resp.text()
-                root = ET.fromstring(result.encode("utf-8"))
-                nsmap = {k if k is not None else "default": v
-                         for k, v in root.nsmap.items()}
-                video = Video(
-                    root.find(".//default:title", namespaces=nsmap).text,
-                    root.find(".//yt:channelId", namespaces=nsmap).text,
-                    root.find("./default:entry/yt:videoId",
-                              namespaces=nsmap).text
-                )
-                latest_videos.append(video)
-        # url = "https://www.googleapis.com/youtube/v3/search"
-        # async with aiohttp.ClientSession() as session:
-        #     params = {
-        #         "key": GOOGLE_API_KEY,
-        #         "part": "snippet",
-        #         "channelId": channel_id,
-        #         "maxResults": "1",
-        #         "order": "date"
-        #         }
-        #     async with session.get(url, params=params) as resp:
-        #         result = await resp.json()
-        #         video = Video(
-        #             result["items"][0]["snippet"]["channelTitle"],
-        #             channel_id,
-        #             result["items"][0]["id"]["videoId"]
-        #         )
-        #         latest_videos.append(video)
-    return latest_videos
+    semaphore = asyncio.Semaphore(YOUTUBE_CONCURRENCY)
+    stats = FeedStats()
+    start = time.monotonic()
+
+    async def collect(channel_id):
+        async with semaphore:
+            try:
+                return await fetch_feed(web, channel_id, stats)
+            except Exception as exception:  # pylint: disable=W0703
+                stats.failed += 1
+                LOG.info("Cannot fetch the feed of %s: %r", channel_id,
+                         exception)
+                return None
+
+    videos = await asyncio.gather(*[collect(channel_id)
+                                    for channel_id in youtubers])
+    stats.elapsed = time.monotonic() - start
+    YOUTUBE_PLATFORM.stats = stats
+    LOG.info("YouTube feeds: %s", stats)
+    return [video for video in videos if video is not None]
 
 class Youtubers(Plugin):
     """Plugin logic"""
@@ -83,57 +176,146 @@ class Youtubers(Plugin):
     def __init__(self, client):
         super().__init__(client)
         self._ready = asyncio.Event(loop=self.client.loop)
+        self.subscriptions = {platform.name: SubscriptionIndex(platform.name)
+                              for platform in self.platforms}
+        self.states = {platform.name: StateTracker(platform.name)
+                       for platform in self.platforms}
+        # Polls and push notifications must not both announce a video
+        self._state_lock = asyncio.Lock()
+        self.websub = None
+        self.client.link.on("youtubers.announce", self.on_remote_announce)
+        self.client.link.on("youtubers.subscription", self.on_subscription)
+        self.client.link.on("youtubers.websub", self.on_remote_websub)
+        if YOUTUBE_PUSH:
+            self.websub = WebSubSubscriber(
+                self.client.web, YOUTUBE_WEBSUB_HUB, YOUTUBE_WEBSUB_CALLBACK,
+                self.on_websub, YOUTUBE_WEBSUB_SECRET, YOUTUBE_WEBSUB_LEASE)
+            path = urlparse(YOUTUBE_WEBSUB_CALLBACK).path or "/"
+            self.client.webhooks.add_route("GET", path,
+                                           self.websub.handle_verify)
+            self.client.webhooks.add_route("POST", path,
+                                           self.websub.handle_notify)
 
     async def wait_until_ready(self):
         await self._ready.wait()
 
     async def on_ready(self):
-        guilds = await self.get_guild_list()
-        for guild in guilds:
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(
-                    "CREATE TABLE IF NOT EXISTS youtubers_{} ("
-                    "id TEXT PRIMARY KEY,"
-                    "latest INTEGER NOT NULL);".format(guild.id))
-                await conn.commit()
+        for index in self.subscriptions.values():
+            await index.load(self.db)
+        for state in self.states.values():
+            await state.load(self.db, self.client.link.owns_channel)
         self._ready.set()
+        if self.websub is not None and self.client.link.primary:
+            # Hubs don't tell us what we subscribed to before a restart,
+            # renewing every lease is the only way to know they are current
+            for channel_id in (
+                    self.subscriptions[YOUTUBE_PLATFORM.name].channel_ids()):
+                if YOUTUBE_TOPIC + channel_id not in self.websub.modes:
+                    await self.subscribe_websub(channel_id)
+
+    async def subscribe_websub(self, channel_id):
+        try:
+            await self.websub.subscribe(YOUTUBE_TOPIC + channel_id)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+
+    async def unsubscribe_websub(self, channel_id):
+        try:
+            await self.websub.unsubscribe(YOUTUBE_TOPIC + channel_id)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+
+    async def on_websub(self, body):
+        video = parse_feed(body.decode("utf-8"))
+        platform = YOUTUBE_PLATFORM
+        if (video is None or
+                not self.subscriptions[platform.name].get_guilds(
+                    video.channel_id)):
+            return
+        if not self.client.link.owns_channel(video.channel_id):
+            # The process polling the channel knows its latest video
+            self.client.link.send_to_channel(
+                video.channel_id, "youtubers.websub",
+                {"body": body.decode("utf-8")})
+            return
+        if (video.published is not None and
+                datetime.utcnow() - video.published > MAX_PUSHED_VIDEO_AGE):
+            return
+        async with self._state_lock:
+            await self.announce(
+                platform, self.states[platform.name].diff_latest([video]))
+
+    async def on_remote_websub(self, data):
+        await self.on_websub(data["body"].encode("utf-8"))
 
     async def get_guild_list(self):
         return self.client.guilds
 
-    async def get_youtubers_by_guilds(self):
-        guilds = await self.get_guild_list()
-        data = defaultdict(list)
-        for platform in self.platforms:
-            youtubers = []
-            temp_data = {}
-            for guild in guilds:
-                async with aiosqlite.connect(self.db.path) as conn:
-                    cursor = await conn.execute(
-                        "SELECT id FROM youtubers_{}".format(guild.id))
-                    guild_youtubers = await cursor.fetchall()
-                    await cursor.close()
-                # cursor fetch all returns the entries as tuples
-                guild_youtubers = [s[0] for s in guild_youtubers]
-                temp_data[guild] = guild_youtubers
-                youtubers += guild_youtubers
-            youtubers = set(youtubers)
-            if not youtubers:
-                continue
+    async def get_latest_videos(self, platform):
+        """Return the latest video of each channel of platform"""
+        youtubers = [channel_id for channel_id
+                     in self.subscriptions[platform.name].channel_ids()
+                     if self.client.link.owns_channel(channel_id)]
+        if not youtubers:
+            return []
 
-            youtubers = set(map(lambda s: re.sub("[^0-9a-zA-Z_-]+", "", s),
-                                youtubers))
-            try:
-                latest_videos = await platform.collector(youtubers)
-                for guild, guild_youtubers in temp_data.items():
-                    for video in latest_videos:
-                        if video.channel_id in guild_youtubers:
-                            data[guild.id].append(video)
+        youtubers = set(map(lambda s: re.sub("[^0-9a-zA-Z_-]+", "", s),
+                            youtubers))
+        try:
+            latest_videos = await platform.collector(self.client.web,
+                                                    youtubers)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.info("Cannot gather youtubers from %s", platform.name)
+            LOG.info("With youtubers: %s", ",".join(youtubers))
+            LOG.exception(exception)
+            return []
+        return latest_videos
 
-            except Exception as exception:  # pylint: disable=W0703
-                LOG.info("Cannot gather youtubers from %s", platform.name)
-                LOG.info("With youtubers: %s", ",".join(youtubers))
-                LOG.exception(exception)
+    async def subscription_changed(self, guild_id, channel_id, added,
+                                   latest=None, published=None):
+        """Apply a subscription change written to the DB here and in every
+        other process
+        """
+        self.client.link.broadcast("youtubers.subscription", {
+            "guild_id": guild_id, "channel_id": channel_id, "added": added,
+            "latest": latest,
+            "published": published.isoformat() if published else None})
+        await self.update_subscription(guild_id, channel_id, added, latest,
+                                       published)
+
+    async def on_subscription(self, data):
+        published = data.get("published")
+        await self.update_subscription(
+            data["guild_id"], data["channel_id"], data["added"],
+            data["latest"],
+            datetime.fromisoformat(published) if published else None)
+
+    async def update_subscription(self, guild_id, channel_id, added,
+                                  latest=None, published=None):
+        subscriptions = self.subscriptions[YOUTUBE_PLATFORM.name]
+        state = self.states[YOUTUBE_PLATFORM.name]
+        push = self.websub is not None and self.client.link.primary
+        if added:
+            subscriptions.add(guild_id, channel_id)
+            if self.client.link.owns_channel(channel_id):
+                state.track(channel_id, latest=latest, published=published)
+            if push:
+                await self.subscribe_websub(channel_id)
+        else:
+            subscriptions.remove(guild_id, channel_id)
+            if not subscriptions.get_guilds(channel_id):
+                state.forget(channel_id)
+                FEED_VALIDATORS.pop(channel_id, None)
+                if push:
+                    await self.unsubscribe_websub(channel_id)
+
+    def group_by_guilds(self, platform, videos):
+        """Return videos grouped by the guilds following their channel"""
+        data = defaultdict(list)
+        subscriptions = self.subscriptions[platform.name]
+        for video in videos:
+            for guild_id in subscriptions.get_guilds(video.channel_id):
+                data[guild_id].append(video)
         return data
 
     @command(pattern="^" + PREFIX + "youtuber (.*)",
@@ -149,44 +331,42 @@ class Youtubers(Plugin):
         channel_id = cmd[1]
         if operation == "add":
             url = "https://www.googleapis.com/youtube/v3/channels"
-            async with aiohttp.ClientSession() as session:
-                params = {"key": GOOGLE_API_KEY, "part": "id", "id": channel_id}
-                # Check if channel exist
-                async with session.get(url, params=params) as resp:
-                    data = await resp.json()
+            params = {"key": GOOGLE_API_KEY, "part": "id", "id": channel_id}
+            # Check if channel exist
+            data = await self.client.web.get_json(url, params=params)
+            if data["pageInfo"]["totalResults"] == 0:
+                response = NOT_FOUND
+            else:
+                url = "https://www.googleapis.com/youtube/v3/search"
+                params = {
+                    "key": GOOGLE_API_KEY,
+                    "part": "snippet",
+                    "channelId": channel_id,
+                    "maxResults": "1",
+                    "order": "date"
+                    }
+                # check for latest video
+                data = await self.client.web.get_json(url, params=params)
                 if data["pageInfo"]["totalResults"] == 0:
                     response = NOT_FOUND
                 else:
-                    url = "https://www.googleapis.com/youtube/v3/search"
-                    params = {
-                        "key": GOOGLE_API_KEY,
-                        "part": "snippet",
-                        "channelId": channel_id,
-                        "maxResults": "1",
-                        "order": "date"
-                        }
-                    # check for latest video
-                    async with session.get(url, params=params) as resp:
-                        data = await resp.json()
-                    if data["pageInfo"]["totalResults"] == 0:
-                        response = NOT_FOUND
-                    else:
-                        # write entry using channel name instead of display name
-                        async with aiosqlite.connect(self.db.path) as conn:
-                            await conn.execute(
-                                "INSERT OR IGNORE INTO youtubers_{} "
-                                "(id,latest) VALUES(?,?)".format(
-                                    message.guild.id),
-                                (channel_id, data["items"][0]["id"]["videoId"]))
-                            await conn.commit()
-                            response = "Added channel {}!".format(channel_id)
+                    item = data["items"][0]
+                    published = parse_published(
+                        item["snippet"]["publishedAt"])
+                    await add_subscription(
+                        self.db, YOUTUBE_PLATFORM.name, message.guild.id,
+                        channel_id, name=item["snippet"]["channelTitle"],
+                        latest=item["id"]["videoId"], published=published)
+                    await self.subscription_changed(
+                        message.guild.id, channel_id, True,
+                        latest=item["id"]["videoId"], published=published)
+                    response = "Added channel {}!".format(channel_id)
         elif operation == "rm":
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(
-                    "DELETE FROM youtubers_{} WHERE id=?".format(
-                        message.guild.id), (channel_id,))
-                await conn.commit()
-                response = "Removed channel {}!".format(channel_id)
+            await remove_subscription(self.db, YOUTUBE_PLATFORM.name,
+                                      message.guild.id, channel_id)
+            await self.subscription_changed(message.guild.id, channel_id,
+                                            False)
+            response = "Removed channel {}!".format(channel_id)
         else:
             response = "Unknown command, use 'add' or 'rm'."
 
@@ -204,57 +384,100 @@ class Youtubers(Plugin):
         youtubers_channel = int(args[0][2:-1])
         youtubers_text = args[1]
         try:
-            async with aiosqlite.connect(self.db.path) as conn:
-                await conn.execute(
-                    "UPDATE guilds SET youtubers_channel=?, youtubers_text=? "
-                    "WHERE id=?", (youtubers_channel, youtubers_text,
-                                   message.guild.id))
-                await conn.commit()
-                response = "Update YouTubers annoucement text and channel!"
+            validate_template(youtubers_text, YOUTUBER_PLACEHOLDERS)
+        except ValueError as exception:
+            await self.client.send_message(message.channel.id,
+                                           str(exception))
+            return
+        try:
+            await self.client.settings.update(
+                message.guild.id, youtubers_channel=youtubers_channel,
+                youtubers_text=youtubers_text)
+            response = "Update YouTubers annoucement text and channel!"
         except Exception as exception:  # pylint: disable=W0703
             LOG.exception(exception)
             response = "Couldn't update YouTubers annoucement text and channel"
         await self.client.send_message(message.channel.id, response)
 
-    @bg_task(60 * 60)
-    async def youtuber_check(self):
-        data = await self.get_youtubers_by_guilds()
-        for guild_id, latest_videos in data.items():
-            guild = self.client.get_guild(guild_id)
-            if not guild:
+    def render_announcements(self, guild_id, videos):
+        """Return the (channel_id, content) announcing videos in guild_id,
+        none if the guild isn't set up on this shard
+        """
+        guild = self.client.get_guild(guild_id)
+        if not guild:
+            return []
+        settings = self.client.settings.get(guild.id)
+        if not settings:
+            return []
+        contents = settings.youtubers_template.render_many(
+            {"youtuber": video.channel_name,
+             "link": "https://www.youtube.com/watch?v={}".format(
+                 video.video_id)}
+            for video in videos)
+        return [(settings.youtubers_channel, content)
+                for content in contents]
+
+    async def on_remote_announce(self, data):
+        """Announce videos for the process polling their channel, return
+        the ids of the ones delivered
+        """
+        videos = [Video(channel_name, channel_id, video_id)
+                  for channel_name, channel_id, video_id in data["videos"]]
+        announcements = self.render_announcements(data["guild_id"], videos)
+        if not announcements:
+            return []
+        delivered = await self.client.announcer.announce_many(announcements)
+        return [video.video_id for video, ok in zip(videos, delivered)
+                if ok]
+
+    async def announce(self, platform, videos):
+        """Announce the new videos in the guilds following their channel
+        and record them as the latest. Guilds on the shards of other
+        processes are announced by them. Call with _state_lock held.
+        """
+        announced = []
+        announcements = []
+        remote = []
+        for guild_id, latest_videos in self.group_by_guilds(
+                platform, videos).items():
+            if not self.client.link.owns_guild(guild_id):
+                remote.append(self.client.link.request_guild(
+                    guild_id, "youtubers.announce",
+                    {"guild_id": guild_id,
+                     "videos": [[video.channel_name, video.channel_id,
+                                 video.video_id]
+                                for video in latest_videos]}))
                 continue
-            async with aiosqlite.connect(self.db.path) as conn:
-                cursor = await conn.execute(
-                    "SELECT youtubers_channel, youtubers_text FROM guilds "
-                    "WHERE id=?", (guild.id,))
-                youtubers_channel, youtubers_text = await cursor.fetchone()
-                await cursor.close()
-            for video in latest_videos:
-                async with aiosqlite.connect(self.db.path) as conn:
-                    cursor = await conn.execute(
-                        "SELECT latest FROM youtubers_{} WHERE id=?".format(
-                            guild.id), (video.channel_id,))
-                    video_ids = await cursor.fetchall()
-                    await cursor.close()
-                video_ids = [id[0] for id in video_ids
-                             if id[0] != "" and id[0] is not None]
-                if video.video_id in video_ids:
-                    continue
-                try:
-                    rep = {
-                        "{youtuber}": video.channel_name,
-                        "{link}": "https://www.youtube.com/watch?v={}".format(
-                            video.video_id)
-                    }
-                    await self.client.send_message(
-                        youtubers_channel,
-                        replace_multiple(rep, youtubers_text)
-                    )
-                    async with aiosqlite.connect(self.db.path) as conn:
-                        await conn.execute(
-                            "UPDATE youtubers_{} SET latest=? WHERE "
-                            "id=?".format(guild.id),
-                            (video.video_id, video.channel_id))
-                        await conn.commit()
-                except Exception as exception:  # pylint: disable=W0703
-                    LOG.exception(exception)
+            rendered = self.render_announcements(guild_id, latest_videos)
+            if rendered:
+                announced += latest_videos
+                announcements += rendered
+        delivered, *acks = await asyncio.gather(
+            self.client.announcer.announce_many(announcements), *remote)
+        # only record a video once it was announced somewhere
+        new_videos = {video.channel_id: video for video, ok
+                      in zip(announced, delivered) if ok}
+        acked = set(video_id for video_ids in acks
+                    for video_id in video_ids or ())
+        new_videos.update((video.channel_id, video) for video in videos
+                          if video.video_id in acked)
+        await self.states[platform.name].commit_latest(
+            self.db, list(new_videos.values()))
+
+    @bg_task(YOUTUBER_CHECK_INTERVAL)
+    async def youtuber_check(self):
+        for platform in self.platforms:
+            latest_videos = await self.get_latest_videos(platform)
+            state = self.states[platform.name]
+            async with self._state_lock:
+                new_videos = state.diff_latest(latest_videos)
+                await self.announce(platform, new_videos)
+                save_validators(latest_videos, new_videos, state)
+
+    @bg_task(60 * 60)
+    async def websub_renew(self):
+        if self.websub is None or not self.client.link.primary:
+            return
+        renewed = await self.websub.renew(YOUTUBE_WEBSUB_RENEW)
+        if renewed:
+            LOG.info("Renewed %d WebSub leases", renewed)
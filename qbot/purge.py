@@ -0,0 +1,194 @@
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import time
+
+from discord.errors import HTTPException, NotFound
+from discord.utils import time_snowflake
+
+LOG = logging.getLogger("discord")
+
+PAGE_SIZE = 100
+BULK_SIZE = 100
+# Discord refuses to bulk delete messages older than two weeks, keep a
+# margin for the time the purge itself takes
+BULK_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+OLD_DELETE_CONCURRENCY = 2
+OLD_DELETE_RETRIES = 3
+OLD_DELETE_BACKOFF = 5
+PROGRESS_INTERVAL = 5
+
+class PurgeFilter:  # pylint: disable=R0903
+    """Which messages to delete: by author, content regex and/or a time
+    window, all optional
+    """
+    def __init__(self, author_id=None, pattern=None, after=None,
+                 before=None):
+        self.author_id = author_id
+        self.pattern = pattern
+        self.after = after
+        self.before = before
+
+    def matches(self, data):
+        if (self.author_id is not None and
+                int(data["author"]["id"]) != self.author_id):
+            return False
+        if self.pattern is not None and not self.pattern.search(
+                data["content"]):
+            return False
+        return True
+
+class PurgeStats:  # pylint: disable=R0903
+    def __init__(self):
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.failed = 0
+        self.done = False
+
+    def __str__(self):
+        return (f"scanned {self.scanned}, deleted {self.deleted}"
+                f"/{self.matched}" +
+                (f", {self.failed} failed" if self.failed else ""))
+
+class Purger:
+    """Deletes the messages matching a filter among the last limit messages
+    of a channel.
+
+    History is read straight from the REST API a page of 100 at a time.
+    Messages younger than two weeks are bulk deleted 100 at a time, older
+    ones can only be deleted one by one so they are queued for a few
+    workers which back off when rate limited, while the paging carries on.
+    on_progress(stats) is awaited at most every progress_interval seconds
+    and once at the end.
+    """
+    def __init__(self, http, channel_id, limit, purge_filter=None,
+                 before=None, on_progress=None,
+                 progress_interval=PROGRESS_INTERVAL):
+        self.http = http
+        self.channel_id = channel_id
+        self.limit = limit
+        self.filter = purge_filter or PurgeFilter()
+        self.before = before
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.stats = PurgeStats()
+        self._last_progress = 0
+        self._old = asyncio.Queue()
+
+    async def pages(self):
+        """Yield the messages to scan, newest first, a page at a time"""
+        before = self.before
+        if self.filter.before is not None:
+            bound = time_snowflake(self.filter.before)
+            before = bound if before is None else min(before, bound)
+        after = (time_snowflake(self.filter.after, high=True)
+                 if self.filter.after is not None else None)
+        remaining = self.limit
+        while remaining > 0:
+            page = await self.http.logs_from(
+                self.channel_id, min(PAGE_SIZE, remaining), before=before)
+            if after is not None:
+                page = [data for data in page if int(data["id"]) > after]
+            if not page:
+                return
+            yield page
+            remaining -= len(page)
+            before = int(page[-1]["id"])
+            if len(page) < PAGE_SIZE:
+                return
+
+    async def _progress(self, force=False):
+        now = time.monotonic()
+        if self.on_progress is None or (
+                not force and now - self._last_progress <
+                self.progress_interval):
+            return
+        self._last_progress = now
+        try:
+            await self.on_progress(self.stats)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+
+    async def _bulk_delete(self, message_ids):
+        try:
+            if len(message_ids) == 1:
+                await self.http.delete_message(self.channel_id,
+                                               message_ids[0])
+            else:
+                await self.http.delete_messages(self.channel_id, message_ids)
+            self.stats.deleted += len(message_ids)
+        except HTTPException as exception:
+            LOG.info("Bulk delete of %d messages failed (%s), deleting them "
+                     "one by one", len(message_ids), exception)
+            for message_id in message_ids:
+                self._old.put_nowait(message_id)
+
+    async def _delete_one(self, message_id):
+        for attempt in range(OLD_DELETE_RETRIES):
+            try:
+                await self.http.delete_message(self.channel_id, message_id)
+                self.stats.deleted += 1
+                return
+            except NotFound:
+                # Someone else deleted it already
+                self.stats.matched -= 1
+                return
+            except HTTPException as exception:
+                # discord.py already waits out the rate limits it knows
+                # of, retry what's still rate limited or a server error
+                if exception.status != 429 and exception.status < 500:
+                    break
+                if attempt < OLD_DELETE_RETRIES - 1:
+                    await asyncio.sleep(OLD_DELETE_BACKOFF * 2 ** attempt)
+        self.stats.failed += 1
+
+    async def _old_worker(self):
+        while True:
+            message_id = await self._old.get()
+            try:
+                await self._delete_one(message_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:  # pylint: disable=W0703
+                # e.g. a timeout, the worker must carry on or run() would
+                # wait for the queue forever
+                LOG.exception(exception)
+                self.stats.failed += 1
+            finally:
+                self._old.task_done()
+            await self._progress()
+
+    async def run(self):
+        bulk_cutoff = time_snowflake(datetime.utcnow() - BULK_MAX_AGE)
+        workers = [asyncio.ensure_future(self._old_worker())
+                   for __ in range(OLD_DELETE_CONCURRENCY)]
+        try:
+            await self._run(bulk_cutoff)
+            await self._old.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+        self.stats.done = True
+        await self._progress(force=True)
+        return self.stats
+
+    async def _run(self, bulk_cutoff):
+        batch = []
+        async for page in self.pages():
+            self.stats.scanned += len(page)
+            for data in page:
+                if not self.filter.matches(data):
+                    continue
+                self.stats.matched += 1
+                message_id = int(data["id"])
+                if message_id > bulk_cutoff:
+                    batch.append(message_id)
+                    if len(batch) == BULK_SIZE:
+                        await self._bulk_delete(batch)
+                        batch = []
+                else:
+                    self._old.put_nowait(message_id)
+            await self._progress()
+        if batch:
+            await self._bulk_delete(batch)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import random
+
+from qbot.metrics import BG_TASK_DURATION, BG_TASK_FAILURES, BG_TASK_OVERRUNS
+
+LOG = logging.getLogger("discord")
+
+# Share of the interval a task's first run is randomly delayed by
+JITTER = 0.1
+# Longest wait between retries of a failing task, unless its interval is
+# longer
+MAX_BACKOFF = 15 * 60
+
+class TaskStats:  # pylint: disable=R0903
+    __slots__ = ("name", "interval", "runs", "failures", "overruns",
+                 "last_duration", "last_error")
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.last_duration = None
+        self.last_error = None
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+class Scheduler:
+    """Runs every bg task of the bot at a fixed rate.
+
+    A run starts interval seconds after the previous one started, not
+    after it ended. Runs that would have started while the previous one
+    was still going are skipped and counted as overruns. A failing task
+    is retried after interval seconds, doubling up to max_backoff for
+    each consecutive failure.
+    """
+    def __init__(self, client, jitter=JITTER, max_backoff=MAX_BACKOFF):
+        self.client = client
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.stats = {}
+        self._tasks = {}
+
+    def register(self, name, func, interval, ignore_errors=True,
+                 wait=None):
+        """Schedule func() every interval seconds once the client, and
+        wait() if given, are ready
+        """
+        stats = self.stats[name] = TaskStats(name, interval)
+        self._tasks[name] = self.client.loop.create_task(
+            self._run(func, stats, ignore_errors, wait))
+
+    async def _run(self, func, stats, ignore_errors, wait):
+        await self.client.wait_until_ready()
+        if wait is not None:
+            await wait()
+        # Don't start every task in the same instant
+        await asyncio.sleep(random.uniform(0, stats.interval * self.jitter))
+
+        loop = asyncio.get_event_loop()
+        interval = stats.interval
+        next_run = loop.time()
+        failures = 0
+        while True:
+            start = loop.time()
+            try:
+                await func()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:  # pylint: disable=W0703
+                stats.failures += 1
+                stats.last_error = repr(exception)
+                BG_TASK_FAILURES.inc(stats.name)
+                if not ignore_errors:
+                    LOG.info("The %s bg task failed, stopping it", stats.name)
+                    raise
+                failures += 1
+                LOG.exception(exception)
+            finally:
+                stats.runs += 1
+                stats.last_duration = loop.time() - start
+                BG_TASK_DURATION.observe(stats.last_duration, stats.name)
+
+            if failures:
+                delay = min(interval * 2 ** (failures - 1),
+                            max(interval, self.max_backoff))
+                LOG.info("An error occured in the %s bg task retrying in %d "
+                         "seconds", stats.name, delay)
+                next_run = loop.time() + delay
+            else:
+                next_run += interval
+                late = loop.time() - next_run
+                if late > 0:
+                    skipped = int(late // interval) + 1
+                    stats.overruns += skipped
+                    BG_TASK_OVERRUNS.inc(stats.name, amount=skipped)
+                    next_run += skipped * interval
+                    LOG.info("The %s bg task overran, skipping %d run(s)",
+                             stats.name, skipped)
+            await asyncio.sleep(next_run - loop.time())
+
+    async def close(self):
+        """Cancel every task and wait for them to stop"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,112 @@
+import asyncio
+from collections import OrderedDict
+import logging
+import time
+
+LOG = logging.getLogger("discord")
+
+MAX_ENTRIES = 1000
+DEFAULT_TTL = 60 * 60
+TTLS = {
+    "twitch": 60 * 60,
+    "urbandict": 24 * 60 * 60,
+    "wiki": 24 * 60 * 60,
+    "youtube": 6 * 60 * 60,
+}
+
+def normalize(query):
+    return " ".join(query.lower().split())
+
+class SearchCache:
+    """TTL cache of search responses keyed by (provider, normalized query).
+
+    Keeps at most max_entries in memory, least recently used first out,
+    and optionally persists entries to the search_cache table so they
+    survive restarts. Concurrent lookups of the same key share a single
+    in-flight fetch.
+    """
+    def __init__(self, db=None, max_entries=MAX_ENTRIES, ttls=None):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, expires, value):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _load(self, key, now):
+        row = await self.db.fetchone(
+            "SELECT expires, value FROM search_cache WHERE provider=? AND "
+            "query=? AND expires>?", key + (now,))
+        if row is not None:
+            self._put(key, *row)
+        return row
+
+    async def _store(self, key, expires, value):
+        try:
+            await self.db.execute(
+                "INSERT OR REPLACE INTO search_cache "
+                "(provider,query,expires,value) VALUES(?,?,?,?)",
+                key + (expires, value))
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+
+    async def get_or_fetch(self, provider, query, fetch):
+        """Return the cached response of provider for query, awaiting
+        fetch() to produce it on a miss
+        """
+        key = (provider, normalize(query))
+        now = time.time()
+        entry = self._get(key, now)
+        if entry is None and self.db is not None:
+            entry = await self._load(key, now)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except BaseException as exception:
+            future.set_exception(exception)
+            # Mark it retrieved, nobody may be waiting for it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        expires = now + self.ttls.get(provider, DEFAULT_TTL)
+        self._put(key, expires, value)
+        future.set_result(value)
+        if self.db is not None:
+            await self._store(key, expires, value)
+        return value
+
+    async def purge_expired(self):
+        """Drop the expired entries from the DB"""
+        if self.db is not None:
+            await self.db.execute("DELETE FROM search_cache WHERE expires<=?",
+                                  (time.time(),))
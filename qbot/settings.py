@@ -0,0 +1,63 @@
+import logging
+
+from qbot.template import compile_template
+
+LOG = logging.getLogger("discord")
+
+COLUMNS = ("streamers_channel", "streamers_text", "youtubers_channel",
+           "youtubers_text", "mod_roles")
+
+def parse_roles(mod_roles):
+    """Parse the comma separated role ids stored in guilds.mod_roles"""
+    if not mod_roles:
+        return frozenset()
+    return frozenset(int(role) for role in mod_roles.split(",") if role)
+
+class GuildSettings:  # pylint: disable=R0903
+    """Typed view of a row of the guilds table"""
+    def __init__(self, guild_id, streamers_channel, streamers_text,
+                 youtubers_channel, youtubers_text, mod_roles):
+        self.guild_id = guild_id
+        self.streamers_channel = streamers_channel
+        self.streamers_text = streamers_text
+        self.youtubers_channel = youtubers_channel
+        self.youtubers_text = youtubers_text
+        self.streamers_template = compile_template(streamers_text)
+        self.youtubers_template = compile_template(youtubers_text)
+        self.mod_roles = parse_roles(mod_roles)
+
+class SettingsCache:
+    """Write-through cache of every guild's settings.
+
+    Loaded once when the bot is ready, reads never hit the DB afterwards
+    and updates are written to the DB before the cached entry is refreshed.
+    """
+    def __init__(self, db):
+        self.db = db
+        self._settings = {}
+
+    async def load(self):
+        rows = await self.db.fetch(
+            "SELECT id, " + ",".join(COLUMNS) + " FROM guilds")
+        self._settings = {row[0]: GuildSettings(*row) for row in rows}
+        LOG.info("Cached the settings of %d guilds", len(self._settings))
+
+    def get(self, guild_id):
+        return self._settings.get(guild_id)
+
+    async def update(self, guild_id, **fields):
+        """Update some of a guild's settings, e.g.
+        update(guild_id, streamers_channel=..., streamers_text=...)
+        """
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError("Unknown guild settings: " + ",".join(unknown))
+        names = list(fields)
+        await self.db.execute(
+            "UPDATE guilds SET " + ",".join(name + "=?" for name in names) +
+            " WHERE id=?", [fields[name] for name in names] + [guild_id])
+        row = await self.db.fetchone(
+            "SELECT id, " + ",".join(COLUMNS) + " FROM guilds WHERE id=?",
+            (guild_id,))
+        if row is not None:
+            self._settings[guild_id] = GuildSettings(*row)
@@ -0,0 +1,215 @@
+"""Helpers for running the bot as several processes.
+
+Tracked Twitch/YouTube channels are partitioned over the shards by a
+stable hash of their id, so each one is polled by a single process.
+Announcements are routed to the process running the shard of the target
+guild, and subscription changes broadcast to every process, through the
+launcher over a unix socket (see qbot/launcher.py).
+"""
+import asyncio
+import json
+import logging
+import zlib
+
+LOG = logging.getLogger("discord")
+
+IPC_RECONNECT = 5
+# Longest frame, above a forwarded WebSub body (aiohttp takes bodies of up
+# to 1 MiB) once JSON escaped
+IPC_FRAME_LIMIT = 4 * 1024 * 1024
+# Seconds to wait for the answer to a request, announcements included
+IPC_REQUEST_TIMEOUT = 60
+
+def guild_shard(guild_id, shard_count):
+    """Shard Discord sends the events of guild_id to"""
+    return (guild_id >> 22) % shard_count
+
+def channel_shard(channel_id, shard_count):
+    """Shard polling a tracked channel, unlike hash() it is the same in
+    every process
+    """
+    return zlib.crc32(str(channel_id).encode("utf-8")) % shard_count
+
+def split_shards(shard_count, processes):
+    """Spread the shard ids over processes as contiguous groups"""
+    size, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for i in range(min(processes, shard_count)):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+def encode(frame):
+    return (json.dumps(frame, separators=(",", ":")) + "\n").encode("utf-8")
+
+async def read_frames(reader):
+    """Yield the JSON frames sent on reader until it is closed"""
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        try:
+            yield json.loads(line)
+        except ValueError:
+            LOG.info("Dropping an invalid IPC frame")
+
+class ShardLink:
+    """This process' end of the IPC channel between shard processes.
+
+    Plugins register a handler per event with on(). Without a socket path,
+    i.e. when the bot was not started by the launcher, the process is on
+    its own: it polls every channel and handles every event itself.
+
+    A request carries an id and the first shard of its sender, the
+    handler's return value is sent back to that shard as a reply frame.
+    """
+    def __init__(self, shard_ids, shard_count, path=None):
+        self.shard_ids = frozenset(shard_ids)
+        self.shard_count = shard_count
+        self.path = path
+        self.handlers = {}
+        self._replies = {}
+        self._next_id = 0
+        self._backlog = []
+        self._writer = None
+        self._task = None
+
+    @property
+    def partitioned(self):
+        return self.path is not None
+
+    @property
+    def primary(self):
+        """Whether this process serves the webhooks and manages the push
+        subscriptions
+        """
+        return not self.partitioned or 0 in self.shard_ids
+
+    def owns_channel(self, channel_id):
+        return (not self.partitioned or
+                channel_shard(channel_id, self.shard_count) in self.shard_ids)
+
+    def owns_guild(self, guild_id):
+        return (not self.partitioned or
+                guild_shard(guild_id, self.shard_count) in self.shard_ids)
+
+    def on(self, event, handler):
+        """Call handler(data) for every event sent to this process"""
+        self.handlers[event] = handler
+
+    def send_to_channel(self, channel_id, event, data):
+        """Have the process polling channel_id handle event"""
+        self._send(channel_shard(channel_id, self.shard_count),
+                   self.owns_channel(channel_id), event, data)
+
+    async def request_guild(self, guild_id, event, data,
+                            timeout=IPC_REQUEST_TIMEOUT):
+        """Have the process running the shard of guild_id handle event and
+        return what its handler returned, None if it failed or didn't
+        answer within timeout seconds
+        """
+        if self.owns_guild(guild_id):
+            return await self._call(event, data)
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_event_loop().create_future()
+        self._replies[request_id] = future
+        self._write({"op": "send",
+                     "shard": guild_shard(guild_id, self.shard_count),
+                     "event": event, "data": data, "id": request_id,
+                     "from": min(self.shard_ids)})
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            LOG.info("No answer to the %s IPC request for guild %s", event,
+                     guild_id)
+            return None
+        finally:
+            self._replies.pop(request_id, None)
+
+    def broadcast(self, event, data):
+        """Have every other process handle event"""
+        if self.partitioned:
+            self._write({"op": "broadcast", "event": event, "data": data})
+
+    def _send(self, shard, local, event, data):
+        if local:
+            self._dispatch({"event": event, "data": data})
+        else:
+            self._write({"op": "send", "shard": shard, "event": event,
+                         "data": data})
+
+    async def _call(self, event, data):
+        handler = self.handlers.get(event)
+        if handler is None:
+            LOG.info("No handler for the %s IPC event", event)
+            return None
+        try:
+            return await handler(data)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+            return None
+
+    def _dispatch(self, frame):
+        if "reply" in frame:
+            future = self._replies.get(frame["reply"])
+            if future is not None and not future.done():
+                future.set_result(frame.get("data"))
+            return
+
+        async def handle():
+            result = await self._call(frame.get("event"), frame.get("data"))
+            if "id" in frame:
+                self._write({"op": "send", "shard": frame["from"],
+                             "reply": frame["id"], "data": result})
+        # Handlers start in the order the events came in, without holding
+        # up the ones behind them
+        asyncio.ensure_future(handle())
+
+    def _write(self, frame):
+        if self._writer is None:
+            self._backlog.append(frame)
+        else:
+            self._writer.write(encode(frame))
+
+    def start(self, loop):
+        if self.partitioned and self._task is None:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    self.path, limit=IPC_FRAME_LIMIT)
+            except OSError as exception:
+                LOG.info("Cannot reach the launcher at %s (%s), retrying in "
+                         "%d seconds", self.path, exception, IPC_RECONNECT)
+                await asyncio.sleep(IPC_RECONNECT)
+                continue
+            writer.write(encode({"op": "hello",
+                                 "shards": sorted(self.shard_ids)}))
+            for frame in self._backlog:
+                writer.write(encode(frame))
+            self._backlog = []
+            self._writer = writer
+            LOG.info("Connected to the launcher as shard(s) %s",
+                     ",".join(map(str, sorted(self.shard_ids))))
+            try:
+                async for frame in read_frames(reader):
+                    self._dispatch(frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:  # pylint: disable=W0703
+                LOG.exception(exception)
+            finally:
+                self._writer = None
+                writer.close()
+            LOG.info("Lost the launcher, reconnecting")
+            await asyncio.sleep(IPC_RECONNECT)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
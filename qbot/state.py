@@ -0,0 +1,94 @@
+from datetime import datetime
+import logging
+
+LOG = logging.getLogger("discord")
+
+class StateTracker:
+    """Last known online status and latest video of a platform's channels.
+
+    Kept in memory so each poll only has to work out the real transitions
+    (offline -> live, live -> offline, new video) and write those, all in
+    one transaction.
+    """
+    def __init__(self, platform):
+        self.platform = platform
+        self.online = set()
+        self.latest = {}
+        # channel_id -> when its latest video was published, if known
+        self.published = {}
+
+    async def load(self, db, owns=None):
+        """Load the state of the channels owns(channel_id) is true for, all
+        of them by default
+        """
+        rows = await db.fetch(
+            "SELECT channel_id, online, latest, published FROM state "
+            "WHERE platform=?", (self.platform,))
+        if owns is not None:
+            rows = [row for row in rows if owns(row[0])]
+        self.online = set(row[0] for row in rows if row[1])
+        self.latest = {row[0]: row[2] for row in rows if row[2]}
+        self.published = {row[0]: datetime.fromisoformat(row[3])
+                          for row in rows if row[3]}
+
+    def track(self, channel_id, latest=None, published=None):
+        """Start tracking a channel, keeping what we already know of it"""
+        if latest and channel_id not in self.latest:
+            self.latest[channel_id] = latest
+            if published:
+                self.published[channel_id] = published
+
+    def forget(self, channel_id):
+        self.online.discard(channel_id)
+        self.latest.pop(channel_id, None)
+        self.published.pop(channel_id, None)
+
+    def diff_online(self, live_ids):
+        """Return the channels which went live and the ones which went
+        offline since the last persisted state
+        """
+        live_ids = set(live_ids)
+        return live_ids - self.online, self.online - live_ids
+
+    def diff_latest(self, videos):
+        """Return the videos which are not the latest known upload of their
+        channel, nor published before it (e.g. an old video being edited)
+        """
+        return [video for video in videos
+                if self.latest.get(video.channel_id) != video.video_id and
+                not self.is_older(video)]
+
+    def is_older(self, video):
+        published = self.published.get(video.channel_id)
+        return (published is not None and video.published is not None and
+                video.published <= published)
+
+    async def commit_online(self, db, went_live, went_offline):
+        if not went_live and not went_offline:
+            return
+        rows = [(1, self.platform, channel_id) for channel_id in went_live]
+        rows += [(0, self.platform, channel_id) for channel_id in went_offline]
+        await db.executemany(
+            "UPDATE state SET online=? WHERE platform=? AND channel_id=?",
+            rows)
+        self.online |= set(went_live)
+        self.online -= set(went_offline)
+        LOG.info("%s: %d went live, %d went offline", self.platform,
+                 len(went_live), len(went_offline))
+
+    async def commit_latest(self, db, videos):
+        if not videos:
+            return
+        await db.executemany(
+            "UPDATE state SET latest=?, published=? WHERE platform=? AND "
+            "channel_id=?",
+            [(video.video_id,
+              video.published.isoformat() if video.published else None,
+              self.platform, video.channel_id) for video in videos])
+        for video in videos:
+            self.latest[video.channel_id] = video.video_id
+            if video.published:
+                self.published[video.channel_id] = video.published
+            else:
+                self.published.pop(video.channel_id, None)
+        LOG.info("%s: %d new videos", self.platform, len(videos))
@@ -0,0 +1,100 @@
+from collections import defaultdict
+import logging
+
+LOG = logging.getLogger("discord")
+
+class SubscriptionIndex:
+    """In-memory view of a platform's subscriptions, kept in both
+    directions: channel_id -> guild ids and guild_id -> channel ids.
+
+    Loaded once at startup and then updated alongside every subscription
+    change, so fan-out never has to go back to the DB.
+    """
+    def __init__(self, platform):
+        self.platform = platform
+        self.guilds = defaultdict(set)
+        self.channels = defaultdict(set)
+
+    async def load(self, db):
+        rows = await db.fetch(
+            "SELECT channel_id, guild_id FROM subscriptions WHERE platform=?",
+            (self.platform,))
+        self.guilds.clear()
+        self.channels.clear()
+        for channel_id, guild_id in rows:
+            self.add(guild_id, channel_id)
+        LOG.info("Loaded %d %s subscriptions", len(rows), self.platform)
+
+    def add(self, guild_id, channel_id):
+        self.guilds[channel_id].add(guild_id)
+        self.channels[guild_id].add(channel_id)
+
+    def remove(self, guild_id, channel_id):
+        guilds = self.guilds.get(channel_id)
+        if guilds is not None:
+            guilds.discard(guild_id)
+            if not guilds:
+                del self.guilds[channel_id]
+        channels = self.channels.get(guild_id)
+        if channels is not None:
+            channels.discard(channel_id)
+            if not channels:
+                del self.channels[guild_id]
+
+    def get_guilds(self, channel_id):
+        return self.guilds.get(channel_id, ())
+
+    def get_channels(self, guild_id):
+        return self.channels.get(guild_id, ())
+
+    def channel_ids(self):
+        return set(self.guilds)
+
+async def add_subscription(db, platform, guild_id, channel_id, name=None,
+                           latest=None, published=None):
+    async with db.transaction() as conn:
+        await conn.execute(
+            "INSERT OR IGNORE INTO channels (platform,channel_id) "
+            "VALUES(?,?)", (platform, channel_id))
+        if name is not None:
+            await conn.execute(
+                "UPDATE channels SET name=? WHERE platform=? AND "
+                "channel_id=?", (name, platform, channel_id))
+        await conn.execute(
+            "INSERT OR IGNORE INTO state (platform,channel_id,latest,"
+            "published) VALUES(?,?,?,?)",
+            (platform, channel_id, latest,
+             published.isoformat() if published else None))
+        await conn.execute(
+            "INSERT OR IGNORE INTO subscriptions "
+            "(platform,channel_id,guild_id) VALUES(?,?,?)",
+            (platform, channel_id, guild_id))
+
+async def remove_subscription(db, platform, guild_id, channel_id):
+    """Unsubscribe a guild from a channel, forgetting the channel once no
+    guild follows it anymore. Returns whether a subscription was removed.
+    """
+    async with db.transaction() as conn:
+        cursor = await conn.execute(
+            "DELETE FROM subscriptions WHERE platform=? AND channel_id=? "
+            "AND guild_id=?", (platform, channel_id, guild_id))
+        removed = cursor.rowcount > 0
+        await cursor.close()
+        cursor = await conn.execute(
+            "SELECT 1 FROM subscriptions WHERE platform=? AND channel_id=? "
+            "LIMIT 1", (platform, channel_id))
+        followed = await cursor.fetchone()
+        await cursor.close()
+        if not followed:
+            for table in ("channels", "state"):
+                await conn.execute(
+                    f"DELETE FROM {table} WHERE platform=? AND channel_id=?",
+                    (platform, channel_id))
+    return removed
+
+async def get_channel_id(db, platform, name):
+    """Look up a channel's id by its stored name"""
+    row = await db.fetchone(
+        "SELECT channel_id FROM channels WHERE platform=? AND name=?",
+        (platform, name))
+    return row[0] if row else None
@@ -0,0 +1,52 @@
+from functools import lru_cache
+import re
+
+PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_]\w*)\}")
+TEMPLATE_CACHE_SIZE = 1024
+
+STREAMER_PLACEHOLDERS = frozenset(("streamer", "link"))
+YOUTUBER_PLACEHOLDERS = frozenset(("youtuber", "link"))
+
+class _Values(dict):
+    """Leave unknown placeholders as they were written"""
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+class Template:
+    """Announcement text such as "{streamer} is now live! {link}" compiled
+    once into a str.format string, so rendering is a single C call.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.placeholders = frozenset(PLACEHOLDER_RE.findall(text))
+        parts = []
+        last = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            parts.append(_escape(text[last:match.start()]))
+            parts.append(match.group(0))
+            last = match.end()
+        parts.append(_escape(text[last:]))
+        self._format = "".join(parts).format_map
+
+    def render(self, values):
+        return self._format(_Values(values))
+
+    def render_many(self, values_list):
+        """Render the template once for each mapping of values"""
+        render = self._format
+        return [render(_Values(values)) for values in values_list]
+
+def _escape(literal):
+    return literal.replace("{", "{{").replace("}", "}}")
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text):
+    return Template(text)
+
+def validate_template(text, placeholders):
+    """Raise ValueError if text uses a placeholder outside of placeholders"""
+    unknown = compile_template(text).placeholders - placeholders
+    if unknown:
+        raise ValueError("Unknown placeholder(s) {}, use {}".format(
+            ", ".join("{" + name + "}" for name in sorted(unknown)),
+            ", ".join("{" + name + "}" for name in sorted(placeholders))))
@@ -0,0 +1,59 @@
+import logging
+
+import aiohttp
+
+from qbot.const import TIMEOUT
+from qbot.metrics import trace_config
+
+LOG = logging.getLogger("discord")
+
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 10
+DNS_CACHE_TTL = 5 * 60
+KEEPALIVE_TIMEOUT = 60
+
+class WebClient:
+    """Bot-wide HTTP client.
+
+    Wraps a single aiohttp.ClientSession so every outbound request shares
+    the same connection pool, keep-alive connections and DNS cache. The
+    session is created lazily on first use since aiohttp wants it created
+    from within the running loop.
+    """
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTION_LIMIT,
+                limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout,
+                trace_configs=[trace_config()])
+        return self._session
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    async def get_json(self, url, **kwargs):
+        async with self.get(url, **kwargs) as resp:
+            return await resp.json()
+
+    async def get_text(self, url, **kwargs):
+        async with self.get(url, **kwargs) as resp:
+            return await resp.text()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
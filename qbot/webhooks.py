@@ -0,0 +1,43 @@
+import logging
+
+from aiohttp import web
+
+from qbot import config
+
+LOG = logging.getLogger("discord")
+
+WEBHOOK_HOST = getattr(config, "WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = getattr(config, "WEBHOOK_PORT", 8080)
+
+class WebhookServer:
+    """Embedded HTTP server receiving push notifications.
+
+    Plugins add their routes while they are loaded, the server is only
+    started, on ready, if at least one route was added.
+    """
+    def __init__(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT,
+                 label="webhooks"):
+        self.host = host
+        self.port = port
+        self.label = label
+        self.app = web.Application()
+        self.paths = []
+        self._runner = None
+
+    def add_route(self, method, path, handler):
+        self.app.router.add_route(method, path, handler)
+        self.paths.append(path)
+
+    async def start(self):
+        if not self.paths or self._runner is not None:
+            return
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        LOG.info("Listening for %s on %s:%d (%s)", self.label, self.host,
+                 self.port, ", ".join(self.paths))
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
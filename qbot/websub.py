@@ -0,0 +1,144 @@
+"""Subscriber side of WebSub (formerly PubSubHubbub).
+
+See https://www.w3.org/TR/websub/
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+
+from aiohttp import web
+
+LOG = logging.getLogger("discord")
+
+LEASE_SECONDS = 5 * 24 * 60 * 60
+# Resubscribe when the hub hasn't confirmed a request after this long
+VERIFY_TIMEOUT = 10 * 60
+
+def sign(secret, body, algorithm="sha1"):
+    """Return the X-Hub-Signature header value of a content delivery"""
+    digest = hmac.new(secret.encode(), body, getattr(hashlib, algorithm))
+    return "{}={}".format(algorithm, digest.hexdigest())
+
+def verify_signature(secret, header, body):
+    algorithm, __, __ = (header or "").partition("=")
+    if algorithm not in ("sha1", "sha256", "sha384", "sha512"):
+        return False
+    return hmac.compare_digest(sign(secret, body, algorithm), header)
+
+class WebSubSubscriber:
+    """Subscribes to topics on a hub and receives their updates.
+
+    handle_verify answers the hub's intent verification (GET) of the
+    (un)subscriptions we asked for, handle_notify takes content deliveries
+    (POST) and hands their body over to on_notify(body) without making the
+    hub wait. Leases are tracked so renew() can resubscribe before they
+    run out.
+    """
+    def __init__(self, web_client, hub, callback, on_notify, secret=None,
+                 lease_seconds=LEASE_SECONDS):
+        self.web = web_client
+        self.hub = hub
+        self.callback = callback
+        self.on_notify = on_notify
+        self.secret = secret
+        self.lease_seconds = lease_seconds
+        # topic -> "subscribe" or "unsubscribe", what we last asked for
+        self.modes = {}
+        self.requested = {}
+        self.expires = {}
+
+    async def _request(self, mode, topic):
+        data = {"hub.callback": self.callback, "hub.mode": mode,
+                "hub.topic": topic, "hub.verify": "async"}
+        if mode == "subscribe":
+            data["hub.lease_seconds"] = str(self.lease_seconds)
+            if self.secret:
+                data["hub.secret"] = self.secret
+        self.modes[topic] = mode
+        self.requested[topic] = time.time()
+        async with self.web.post(self.hub, data=data) as resp:
+            if resp.status >= 300:
+                raise RuntimeError("The hub refused to {} {}: {} {}".format(
+                    mode, topic, resp.status, await resp.text()))
+
+    async def subscribe(self, topic):
+        await self._request("subscribe", topic)
+
+    async def unsubscribe(self, topic):
+        self.expires.pop(topic, None)
+        try:
+            await self._request("unsubscribe", topic)
+        finally:
+            # Nothing left to renew, whether the hub heard us or not
+            self.modes.pop(topic, None)
+            self.requested.pop(topic, None)
+
+    def due(self, margin, now=None):
+        """Return the subscribed topics whose lease ends within margin
+        seconds, or which the hub never confirmed
+        """
+        now = now or time.time()
+        topics = []
+        for topic, mode in self.modes.items():
+            if mode != "subscribe":
+                continue
+            expires = self.expires.get(topic)
+            if expires is None:
+                if self.requested[topic] < now - VERIFY_TIMEOUT:
+                    topics.append(topic)
+            elif expires - now < margin:
+                topics.append(topic)
+        return topics
+
+    async def renew(self, margin):
+        """Resubscribe the topics due, return how many were renewed"""
+        topics = self.due(margin)
+        for topic in topics:
+            try:
+                await self.subscribe(topic)
+            except Exception as exception:  # pylint: disable=W0703
+                LOG.exception(exception)
+        return len(topics)
+
+    async def handle_verify(self, request):
+        query = request.query
+        mode = query.get("hub.mode")
+        topic = query.get("hub.topic")
+        if mode == "denied":
+            LOG.info("The hub denied the subscription to %s: %s", topic,
+                     query.get("hub.reason"))
+            self.expires.pop(topic, None)
+            return web.Response(text="")
+        if (mode not in ("subscribe", "unsubscribe") or
+                self.modes.get(topic, "unsubscribe") != mode or
+                "hub.challenge" not in query):
+            # Not something we asked for
+            return web.Response(status=404)
+        if mode == "subscribe":
+            try:
+                lease = int(query.get("hub.lease_seconds",
+                                      self.lease_seconds))
+            except ValueError:
+                lease = self.lease_seconds
+            self.expires[topic] = time.time() + lease
+            LOG.debug("Subscribed to %s for %ds", topic, lease)
+        return web.Response(text=query["hub.challenge"],
+                            content_type="text/plain")
+
+    async def _run(self, body):
+        try:
+            await self.on_notify(body)
+        except Exception as exception:  # pylint: disable=W0703
+            LOG.exception(exception)
+
+    async def handle_notify(self, request):
+        body = await request.read()
+        if self.secret and not verify_signature(
+                self.secret, request.headers.get("X-Hub-Signature"), body):
+            # The spec wants a 2xx anyway so forgeries learn nothing
+            LOG.info("Dropped WebSub delivery with a bad signature")
+            return web.Response(status=202)
+        asyncio.ensure_future(self._run(body))
+        return web.Response(status=202)
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+"""Stand-in for Twitch delivering EventSub webhooks, to exercise the bot's
+receiver locally.
+
+    python tools/fake_eventsub.py URL SECRET (online|offline) USER_ID LOGIN
+
+Runs the challenge handshake first, then sends a signed stream.online or
+stream.offline notification twice (Twitch may redeliver, the receiver
+should only act once), and a message with a bad signature which must be
+rejected.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import os
+import sys
+import uuid
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from qbot.eventsub import (MESSAGE_ID, MESSAGE_SIGNATURE,  # noqa: E402
+                           MESSAGE_TIMESTAMP, MESSAGE_TYPE, NOTIFICATION,
+                           VERIFICATION, sign)
+
+def subscription(subscription_type, user_id, url):
+    return {
+        "id": str(uuid.uuid4()),
+        "status": "enabled",
+        "type": subscription_type,
+        "version": "1",
+        "condition": {"broadcaster_user_id": user_id},
+        "transport": {"method": "webhook", "callback": url},
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+async def send(session, url, secret, message_type, payload, message_id=None,
+               bad_signature=False):
+    body = json.dumps(payload).encode()
+    message_id = message_id or str(uuid.uuid4())
+    timestamp = datetime.now(timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%S.%fZ")
+    signature = sign(secret, message_id, timestamp, body)
+    if bad_signature:
+        signature = sign(secret + "x", message_id, timestamp, body)
+    headers = {MESSAGE_ID: message_id, MESSAGE_TIMESTAMP: timestamp,
+               MESSAGE_SIGNATURE: signature, MESSAGE_TYPE: message_type,
+               "Content-Type": "application/json"}
+    async with session.post(url, data=body, headers=headers) as resp:
+        return resp.status, await resp.text()
+
+async def main(args):
+    subscription_type = "stream." + args.event
+    sub = subscription(subscription_type, args.user_id, args.url)
+    async with aiohttp.ClientSession() as session:
+        challenge = str(uuid.uuid4())
+        status, text = await send(session, args.url, args.secret,
+                                  VERIFICATION,
+                                  {"challenge": challenge,
+                                   "subscription": sub})
+        print(f"challenge: {status} "
+              f"{'ok' if text == challenge else 'WRONG ' + repr(text)}")
+
+        event = {"broadcaster_user_id": args.user_id,
+                 "broadcaster_user_login": args.login,
+                 "broadcaster_user_name": args.login}
+        if args.event == "online":
+            event.update(id=str(uuid.uuid4()), type="live",
+                         started_at=datetime.now(timezone.utc).isoformat())
+        payload = {"subscription": sub, "event": event}
+        message_id = str(uuid.uuid4())
+        for attempt in ("notification", "redelivery"):
+            status, __ = await send(session, args.url, args.secret,
+                                    NOTIFICATION, payload, message_id)
+            print(f"{attempt}: {status}")
+        status, __ = await send(session, args.url, args.secret, NOTIFICATION,
+                                payload, bad_signature=True)
+        print(f"bad signature: {status} "
+              f"{'ok' if status == 403 else 'NOT REJECTED'}")
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    PARSER.add_argument("url")
+    PARSER.add_argument("secret")
+    PARSER.add_argument("event", choices=("online", "offline"))
+    PARSER.add_argument("user_id")
+    PARSER.add_argument("login")
+    asyncio.run(main(PARSER.parse_args()))
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+"""Stand-in for a WebSub hub such as pubsubhubbub.appspot.com, to exercise
+the bot's YouTube subscriber locally.
+
+    python tools/fake_websub_hub.py [--port 8090] [--lease SECONDS]
+                                    [--publish-after SECONDS]
+
+Point YOUTUBE_WEBSUB_HUB at http://localhost:PORT/subscribe. Every
+(un)subscription request is verified against the callback with a random
+challenge, like a real hub would. --publish-after delivers a new-video
+Atom entry for each verified topic that many seconds later, signed with
+the secret the subscriber gave.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+import uuid
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from qbot.websub import sign  # noqa: E402
+
+ENTRY = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015"
+      xmlns="http://www.w3.org/2005/Atom">
+  <link rel="hub" href="https://pubsubhubbub.appspot.com"/>
+  <link rel="self" href="{topic}"/>
+  <title>YouTube video feed</title>
+  <updated>{now}</updated>
+  <entry>
+    <id>yt:video:{video_id}</id>
+    <yt:videoId>{video_id}</yt:videoId>
+    <yt:channelId>{channel_id}</yt:channelId>
+    <title>Fake upload {video_id}</title>
+    <link rel="alternate" href="https://www.youtube.com/watch?v={video_id}"/>
+    <author>
+      <name>Fake channel {channel_id}</name>
+      <uri>https://www.youtube.com/channel/{channel_id}</uri>
+    </author>
+    <published>{now}</published>
+    <updated>{now}</updated>
+  </entry>
+</feed>
+"""
+
+class FakeHub:
+    def __init__(self, lease, publish_after):
+        self.lease = lease
+        self.publish_after = publish_after
+        # (callback, topic) -> secret
+        self.subscriptions = {}
+
+    async def handle_subscribe(self, request):
+        form = await request.post()
+        mode = form.get("hub.mode")
+        if mode not in ("subscribe", "unsubscribe"):
+            return web.Response(status=400, text="bad hub.mode")
+        asyncio.ensure_future(self.verify(
+            mode, form["hub.callback"], form["hub.topic"],
+            form.get("hub.secret")))
+        return web.Response(status=202)
+
+    async def verify(self, mode, callback, topic, secret):
+        challenge = uuid.uuid4().hex
+        params = {"hub.mode": mode, "hub.topic": topic,
+                  "hub.challenge": challenge}
+        if mode == "subscribe":
+            params["hub.lease_seconds"] = str(self.lease)
+        async with aiohttp.ClientSession() as session:
+            async with session.get(callback, params=params) as resp:
+                ok = resp.status == 200 and await resp.text() == challenge
+        print(f"{mode} {topic}: {'verified' if ok else 'NOT verified'}")
+        if not ok:
+            return
+        if mode == "unsubscribe":
+            self.subscriptions.pop((callback, topic), None)
+            return
+        self.subscriptions[(callback, topic)] = secret
+        if self.publish_after is not None:
+            await asyncio.sleep(self.publish_after)
+            if (callback, topic) in self.subscriptions:
+                await self.publish(callback, topic)
+
+    async def publish(self, callback, topic):
+        channel_id = parse_qs(urlparse(topic).query)["channel_id"][0]
+        body = ENTRY.format(
+            topic=topic, channel_id=channel_id, video_id=uuid.uuid4().hex[:11],
+            now=datetime.now(timezone.utc).isoformat()).encode()
+        headers = {"Content-Type": "application/atom+xml"}
+        secret = self.subscriptions[(callback, topic)]
+        if secret:
+            headers["X-Hub-Signature"] = sign(secret, body)
+        async with aiohttp.ClientSession() as session:
+            async with session.post(callback, data=body,
+                                    headers=headers) as resp:
+                print(f"published to {callback}: {resp.status}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--lease", type=int, default=300)
+    parser.add_argument("--publish-after", type=float, default=None)
+    args = parser.parse_args()
+    hub = FakeHub(args.lease, args.publish_after)
+    app = web.Application()
+    app.router.add_post("/subscribe", hub.handle_subscribe)
+    web.run_app(app, port=args.port)
+
+if __name__ == "__main__":
+    main()